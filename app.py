@@ -5,18 +5,23 @@ Aplicación principal Streamlit — Cálculo de RLI e IDPC.
 Régimen 14 D N°3 | Impuesto de Primera Categoría 12,5%
 """
 
-import os
 import io
-import tempfile
+import hashlib
+import logging
 import streamlit as st
 from pathlib import Path
 
 # Importar módulos propios
-from extractor import extraer_balance, get_valor, get_nombre
+from extractor import (
+    extraer_balance,
+    get_valor,
+    get_nombre,
+    verificar_totales,
+    InformeExtraccion,
+    PDFSinTextoError,
+)
 from regimen_14d3 import (
-    construir_lineas_ingresos,
-    construir_lineas_egresos,
-    construir_lineas_gastos_rechazados,
+    construir_lineas,
     calcular_total_ingresos,
     calcular_total_egresos,
     calcular_total_gastos_rechazados,
@@ -34,6 +39,8 @@ from regimen_14d3 import (
 from regimen_14a import render_14a_placeholder
 from export_pdf import render_export_btn
 
+logger = logging.getLogger(__name__)
+
 # ---------------------------------------------------------------------------
 # Config página
 # ---------------------------------------------------------------------------
@@ -72,6 +79,8 @@ def _init_state():
         "uf_cantidad": UF_DEFECTO,
         "montos_editados": {},          # {codigo: monto_editado}
         "regimen": "14 D N°3",
+        "pdf_hash": None,               # SHA-256 del último PDF procesado
+        "pdf_error": None,              # mensaje si ese PDF no se pudo extraer
     }
     for k, v in defaults.items():
         if k not in st.session_state:
@@ -80,6 +89,66 @@ def _init_state():
 _init_state()
 
 
+# ---------------------------------------------------------------------------
+# INGESTA DEL BALANCE
+# ---------------------------------------------------------------------------
+def _ingerir_balance(pdf_file):
+    """
+    Extrae el balance solo una vez por PDF distinto.
+    El uploader conserva el archivo entre reruns, por lo que se identifica
+    el contenido por su hash SHA-256 y se omite la extracción (y el reinicio
+    de montos_editados) si ese mismo PDF ya fue procesado. Un PDF que falla
+    también se recuerda, con su mensaje de error, para no reintentarlo en
+    cada rerun; el balance anterior se descarta.
+    """
+    datos = pdf_file.getvalue()
+    pdf_hash = hashlib.sha256(datos).hexdigest()
+
+    if st.session_state["pdf_hash"] == pdf_hash:
+        if st.session_state["pdf_error"]:
+            st.error(st.session_state["pdf_error"])
+        else:
+            _mostrar_estado_balance(st.session_state["cuentas"])
+        return
+
+    # pdf_hash se asigna junto con el resultado: si el rerun se interrumpe
+    # durante la extracción (RerunException no es Exception), el PDF se
+    # vuelve a procesar en el rerun siguiente.
+    try:
+        informe = InformeExtraccion()
+        with st.spinner("Extrayendo datos del balance..."):
+            cuentas, empresa = extraer_balance(datos, usar_cache=True, motor="auto",
+                                               informe=informe, bajo_consumo=True,
+                                               usar_plantillas=True)
+    except PDFSinTextoError as e:
+        error = f"❌ No se puede leer el balance: {e}"
+    except Exception as e:
+        error = f"❌ Error al procesar el PDF: {e}"
+    else:
+        logger.info("Balance %s: %s", pdf_hash[:12], informe.resumen())
+        st.session_state["cuentas"] = cuentas
+        st.session_state["empresa"] = empresa
+        st.session_state["montos_editados"] = {}
+        st.session_state["pdf_error"] = None
+        st.session_state["pdf_hash"] = pdf_hash
+        _mostrar_estado_balance(cuentas)
+        return
+
+    logger.warning("Balance %s: %s", pdf_hash[:12], error)
+    st.session_state["cuentas"] = {}
+    st.session_state["empresa"] = {}
+    st.session_state["montos_editados"] = {}
+    st.session_state["pdf_error"] = error
+    st.session_state["pdf_hash"] = pdf_hash
+    st.error(error)
+
+
+def _mostrar_estado_balance(cuentas):
+    st.success(f"✅ Balance cargado — {len(cuentas)} cuentas extraídas")
+    for descuadre in verificar_totales(cuentas):
+        st.warning(f"⚠️ Balance no cuadra — {descuadre}")
+
+
 # ---------------------------------------------------------------------------
 # SIDEBAR
 # ---------------------------------------------------------------------------
@@ -92,20 +161,7 @@ def render_sidebar():
             key="pdf_upload",
         )
         if pdf_file is not None:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                tmp.write(pdf_file.read())
-                tmp_path = tmp.name
-            try:
-                with st.spinner("Extrayendo datos del balance..."):
-                    cuentas, empresa = extraer_balance(tmp_path)
-                st.session_state["cuentas"] = cuentas
-                st.session_state["empresa"] = empresa
-                st.session_state["montos_editados"] = {}
-                st.success(f"✅ Balance cargado — {len(cuentas)} cuentas extraídas")
-            except Exception as e:
-                st.error(f"❌ Error al procesar el PDF: {e}")
-            finally:
-                os.unlink(tmp_path)
+            _ingerir_balance(pdf_file)
 
         st.markdown("---")
         st.markdown("## ⚙️ Régimen Tributario")
@@ -198,13 +254,9 @@ def _monto_desde_balance(cuentas: dict, codigo: str) -> int:
     """
     Retorna el monto más representativo de la cuenta:
     prioriza ganancias → pérdidas → activos → pasivos → saldo_acreedor → saldo_deudor
+    (lectura directa del índice precalculado de TablaBalance).
     """
-    reg = cuentas.get(codigo, {})
-    for col in ("ganancias", "perdidas", "activos", "pasivos", "saldo_acreedor", "saldo_deudor"):
-        val = reg.get(col, 0)
-        if val and val > 0:
-            return int(val)
-    return 0
+    return int(get_valor(cuentas, codigo))
 
 
 def _get_monto(linea, seccion: str) -> int:
@@ -360,7 +412,7 @@ def _render_agregar_cuenta(cuentas: dict, prefijo: str, lista_key: str):
 # ---------------------------------------------------------------------------
 # Sección I — INGRESOS
 # ---------------------------------------------------------------------------
-def render_ingresos(cuentas: dict):
+def render_ingresos(cuentas: dict, lineas: list):
     st.markdown('<div class="seccion-bloque">', unsafe_allow_html=True)
     st.markdown('<div class="seccion-titulo">I. INGRESOS DEL EJERCICIO</div>', unsafe_allow_html=True)
 
@@ -368,8 +420,6 @@ def render_ingresos(cuentas: dict):
     if "extras_ingresos_giro" not in st.session_state:
         st.session_state["extras_ingresos_giro"] = []
 
-    lineas = construir_lineas_ingresos(cuentas, st.session_state["extras_ingresos"])
-
     # Encabezados tabla
     col_cod, col_nombre, col_monto, col_signo, col_f22, col_acciones = st.columns(
         [1.2, 4, 2, 0.6, 1, 1]
@@ -593,7 +643,7 @@ def render_ingresos(cuentas: dict):
 # ---------------------------------------------------------------------------
 # Sección II — EGRESOS
 # ---------------------------------------------------------------------------
-def render_egresos(cuentas: dict):
+def render_egresos(cuentas: dict, lineas: list):
     st.markdown('<div class="seccion-bloque">', unsafe_allow_html=True)
     st.markdown('<div class="seccion-titulo">II. EGRESOS DEL EJERCICIO</div>', unsafe_allow_html=True)
 
@@ -605,8 +655,6 @@ def render_egresos(cuentas: dict):
     if "extras_existencias_resta" not in st.session_state:
         st.session_state["extras_existencias_resta"] = []
 
-    lineas = construir_lineas_egresos(cuentas, st.session_state["extras_egresos"])
-
     col_cod, col_nombre, col_monto, col_signo, col_f22, col_acc = st.columns([1.2, 4, 2, 0.6, 1, 1])
     col_cod.markdown("**Código**")
     col_nombre.markdown("**Cuenta**")
@@ -926,12 +974,10 @@ def render_egresos(cuentas: dict):
 # ---------------------------------------------------------------------------
 # Sección III — GASTOS RECHAZADOS
 # ---------------------------------------------------------------------------
-def render_gastos_rechazados(cuentas: dict):
+def render_gastos_rechazados(cuentas: dict, lineas: list):
     st.markdown('<div class="seccion-bloque">', unsafe_allow_html=True)
     st.markdown('<div class="seccion-titulo">III. GASTOS RECHAZADOS</div>', unsafe_allow_html=True)
 
-    lineas = construir_lineas_gastos_rechazados(cuentas, st.session_state["extras_gastos"])
-
     col_cod, col_nombre, col_monto, col_signo, col_f22, col_acc = st.columns([1.2, 4, 2, 0.6, 1, 1])
     col_cod.markdown("**Código**")
     col_nombre.markdown("**Cuenta**")
@@ -1235,12 +1281,17 @@ def main():
 
     # --- Régimen 14 D N°3 ---
     cuentas = st.session_state["cuentas"]
+    # Las tres secciones se construyen una vez por rerun
+    lineas = construir_lineas(cuentas,
+                              st.session_state["extras_ingresos"],
+                              st.session_state["extras_egresos"],
+                              st.session_state["extras_gastos"])
 
-    total_ing = render_ingresos(cuentas)
+    total_ing = render_ingresos(cuentas, lineas["ingresos"])
     st.markdown("<br>", unsafe_allow_html=True)
-    total_egr = render_egresos(cuentas)
+    total_egr = render_egresos(cuentas, lineas["egresos"])
     st.markdown("<br>", unsafe_allow_html=True)
-    total_gst = render_gastos_rechazados(cuentas)
+    total_gst = render_gastos_rechazados(cuentas, lineas["gastos_rechazados"])
 
     render_calculo(cuentas, total_ing, total_egr, total_gst)
 
@@ -0,0 +1,287 @@
+"""
+bench_extractor.py
+==================
+Benchmark de extractor.extraer_balance sobre balances de 8 columnas
+sintéticos generados con reportlab.
+
+El PDF de cada caso se genera en el proceso principal y la extracción se
+ejecuta en un proceso nuevo, para que el peak RSS sea propio de
+extraer_balance. Los resultados se escriben en JSON para comparar versiones del
+extractor.
+
+Uso:
+    python benchmarks/bench_extractor.py --paginas 1 10 100 --salida bench.json
+    python benchmarks/bench_extractor.py --paginas 500 --motor pdfium --sin-encabezado
+"""
+
+import argparse
+import io
+import json
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfgen import canvas
+
+import extractor
+
+
+# ---------------------------------------------------------------------------
+# Generación de balances sintéticos
+# ---------------------------------------------------------------------------
+_ENCABEZADOS = ("DEBITOS", "CREDITOS", "DEUDOR", "ACREEDOR",
+                "ACTIVOS", "PASIVOS", "PERDIDAS", "GANANCIAS")
+# Centros X relativos de las 8 columnas numéricas
+_COLUMNAS_X = (0.33, 0.42, 0.51, 0.59, 0.67, 0.73, 0.82, 0.92)
+_ALTO_FILA = 10
+_MARGEN = 40
+_MONTO_MAX = 10**7
+# Las filas SUMAS / TOTALES van en una fuente menor: con montos de hasta
+# _MONTO_MAX, sus sumas caben entre columnas vecinas (ACTIVOS y PASIVOS están
+# a 0,06 del ancho) sin que el texto de una toque el de la otra.
+_FUENTE_TOTALES = 6
+
+FORMATOS = {
+    "puntos": lambda n: f"{n:,}".replace(",", "."),   # 1.234.567
+    "simple": str,                                    # 1234567
+}
+
+
+def _montos_cuadrados(rnd: random.Random):
+    """
+    Genera los 8 montos de cada cuenta en pares espejo: la segunda cuenta del
+    par tiene los débitos y créditos de la primera intercambiados, con el
+    saldo en la columna opuesta del mismo grupo (activos/pasivos o
+    pérdidas/ganancias). Cualquier balance que termine en un par completo
+    cuadra en SUMAS y en TOTALES.
+    """
+    while True:
+        debitos, creditos = rnd.sample(range(1, _MONTO_MAX), 2)
+        saldo = abs(debitos - creditos)
+        grupo = 4 if rnd.random() < 0.5 else 6          # activos/pasivos o pérdidas/ganancias
+        for d, c in ((debitos, creditos), (creditos, debitos)):
+            montos = [d, c, 0, 0, 0, 0, 0, 0]
+            deudor = d > c
+            montos[2 if deudor else 3] = saldo
+            montos[grupo if deudor else grupo + 1] = saldo
+            yield montos
+
+
+def generar_balance(paginas: int, cuentas_por_pagina: int = 40,
+                    encabezado_por_pagina: bool = False,
+                    formato: str = "puntos", semilla: int = 1,
+                    paginas_firma: int = 0) -> tuple[bytes, int]:
+    """
+    Genera un PDF de balance de 8 columnas que termina con las filas SUMAS y
+    TOTALES, seguidas de paginas_firma páginas de firmas y notas. Las cuentas
+    van en pares espejo (ver _montos_cuadrados), así que ambas filas cuadran.
+    Retorna (pdf_bytes, n_cuentas), donde n_cuentas es la cantidad de cuentas
+    con saldo que el extractor debería encontrar.
+    """
+    rnd = random.Random(semilla)
+    fmt = FORMATOS[formato]
+    ancho, alto = landscape(A4)
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=(ancho, alto))
+    codigo = 100000
+    n_cuentas = 0
+    sumas = [0] * 8
+    generador = _montos_cuadrados(rnd)
+
+    for p in range(paginas):
+        y = alto - _MARGEN
+        c.setFont("Helvetica", 9)
+        if p == 0:
+            for linea in ("EMPRESA DE PRUEBA LIMITADA", "76.123.456-7", "SERVICIOS CONTABLES",
+                          "AV PROVIDENCIA 1234", "PROVIDENCIA",
+                          "BALANCE DESDE ENERO DEL 2024 HASTA DICIEMBRE DEL 2024"):
+                c.drawString(_MARGEN, y, linea)
+                y -= 12
+        if p == 0 or encabezado_por_pagina:
+            c.drawString(_MARGEN, y, "CODIGO")
+            c.drawString(_MARGEN + 50, y, "CUENTA")
+            for x, texto in zip(_COLUMNAS_X, _ENCABEZADOS):
+                c.drawCentredString(ancho * x, y, texto)
+            y -= 14
+
+        c.setFont("Helvetica", 7)
+        filas = min(cuentas_por_pagina, int((y - _MARGEN) // _ALTO_FILA))
+        if p == paginas - 1 and (n_cuentas + filas) % 2:
+            filas -= 1          # el balance termina en un par completo
+        for _ in range(filas):
+            codigo += rnd.randint(1, 9)
+            montos = next(generador)
+            sumas = [a + b for a, b in zip(sumas, montos)]
+            c.drawString(_MARGEN, y, str(codigo))
+            c.drawString(_MARGEN + 50, y, f"CUENTA {rnd.choice('ABCDEFGH')}{rnd.choice('XYZ')}")
+            for x, monto in zip(_COLUMNAS_X, montos):
+                if monto:
+                    c.drawRightString(ancho * x + 20, y, fmt(monto))
+            y -= _ALTO_FILA
+            n_cuentas += 1
+
+        if p == paginas - 1:
+            c.setFont("Helvetica", _FUENTE_TOTALES)
+            for etiqueta in ("SUMAS", "TOTALES"):
+                c.drawString(_MARGEN + 50, y, etiqueta)
+                for x, monto in zip(_COLUMNAS_X, sumas):
+                    c.drawRightString(ancho * x + 20, y, fmt(monto))
+                y -= _ALTO_FILA
+
+        c.setFont("Helvetica", 8)
+        c.drawCentredString(ancho / 2, _MARGEN / 2, f"Página {p + 1} de {paginas}")
+        c.showPage()
+
+    for p in range(paginas_firma):
+        c.setFont("Helvetica", 9)
+        y = alto - _MARGEN
+        for n in range(40):
+            c.drawString(_MARGEN, y, f"Nota {p + 1}.{n + 1}: los saldos se presentan en pesos chilenos.")
+            y -= 12
+        c.line(ancho * 0.2, 80, ancho * 0.4, 80)
+        c.drawCentredString(ancho * 0.3, 68, "FIRMA CONTADOR")
+        c.line(ancho * 0.6, 80, ancho * 0.8, 80)
+        c.drawCentredString(ancho * 0.7, 68, "FIRMA REPRESENTANTE LEGAL")
+        c.showPage()
+
+    c.save()
+    return buf.getvalue(), n_cuentas
+
+
+# ---------------------------------------------------------------------------
+# Medición
+# ---------------------------------------------------------------------------
+def _percentil(valores: list[float], q: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    idx = min(len(ordenados) - 1, max(0, round(q / 100 * (len(ordenados) - 1))))
+    return ordenados[idx]
+
+
+def _maxrss_mb() -> float:
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                 / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def medir_caso(caso: dict, pdf: bytes) -> dict:
+    """Ejecuta un caso (en su propio proceso) sobre el PDF ya generado y retorna sus métricas."""
+    # Extracción completa, con tiempos por etapa. ru_maxrss es el máximo del
+    # proceso, así que se lee justo antes y justo después de extraer_balance.
+    informe = extractor.InformeExtraccion()
+    rss_inicial = _maxrss_mb()
+    t0 = time.perf_counter()
+    cuentas, _ = extractor.extraer_balance(pdf, motor=caso["motor"], informe=informe,
+                                           bajo_consumo=caso["bajo_consumo"])
+    t_total = time.perf_counter() - t0
+    rss_pico = _maxrss_mb()
+
+    # Latencia por página desde el iterador de filas: la primera fila de una
+    # página llega cuando sus palabras ya fueron extraídas, así que la
+    # latencia de la página k es el intervalo entre la primera fila de k-1
+    # y la de k (la primera página incluye la apertura del documento).
+    marcas: list[float] = []
+    filas = 0
+    pagina_actual = None
+    t0 = time.perf_counter()
+    for fila in extractor.iter_filas_balance(pdf, caso["motor"]):
+        filas += 1
+        if fila.pagina != pagina_actual:
+            marcas.append(time.perf_counter())
+            pagina_actual = fila.pagina
+    t_iter = time.perf_counter() - t0
+    latencias = [b - a for a, b in zip([t0] + marcas, marcas)]
+
+    return {
+        **caso,
+        "bytes_pdf": len(pdf),
+        "cuentas_extraidas": len(cuentas),
+        "segundos_extraer_balance": round(t_total, 4),
+        "segundos_por_etapa": {k: round(v, 4) for k, v in informe.etapas.items()},
+        "segundos_iter_filas": round(t_iter, 4),
+        "filas_por_segundo": round(filas / t_iter, 1) if t_iter else None,
+        "latencia_pagina_ms": {
+            "p50": round(_percentil(latencias, 50) * 1000, 2),
+            "p90": round(_percentil(latencias, 90) * 1000, 2),
+            "p99": round(_percentil(latencias, 99) * 1000, 2),
+            "max": round(max(latencias, default=0) * 1000, 2),
+            "media": round(statistics.fmean(latencias) * 1000, 2) if latencias else 0,
+        },
+        "rss_inicial_mb": rss_inicial,
+        "peak_rss_mb": rss_pico,
+    }
+
+
+def ejecutar(casos: list[dict]) -> list[dict]:
+    resultados = []
+    contexto = get_context("spawn")
+    for caso in casos:
+        t0 = time.perf_counter()
+        pdf, esperadas = generar_balance(caso["paginas"], caso["cuentas_por_pagina"],
+                                         caso["encabezado_por_pagina"], caso["formato"],
+                                         paginas_firma=caso["paginas_firma"])
+        t_generar = time.perf_counter() - t0
+        with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as pool:
+            r = pool.submit(medir_caso, caso, pdf).result()
+        r["cuentas_esperadas"] = esperadas
+        r["segundos_generar"] = round(t_generar, 4)
+        print(f"{r['paginas']:>4} pág | {r['motor']:<10} | {r['formato']:<6} | "
+              f"enc={'sí' if r['encabezado_por_pagina'] else 'no'} | "
+              f"{r['segundos_extraer_balance']:>8.3f} s | {r['filas_por_segundo']:>9} filas/s | "
+              f"p50 {r['latencia_pagina_ms']['p50']:>7} ms | {r['peak_rss_mb']:>6} MB | "
+              f"{r['cuentas_extraidas']}/{r['cuentas_esperadas']} cuentas",
+              file=sys.stderr)
+        resultados.append(r)
+    return resultados
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--paginas", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--cuentas-por-pagina", type=int, nargs="+", default=[40])
+    parser.add_argument("--motor", nargs="+", default=["pdfplumber"], choices=extractor.MOTORES)
+    parser.add_argument("--formato", nargs="+", default=["puntos"], choices=list(FORMATOS))
+    parser.add_argument("--sin-encabezado", action="store_true",
+                        help="solo la primera página lleva fila de encabezados")
+    parser.add_argument("--paginas-firma", type=int, default=0,
+                        help="páginas de firmas y notas después de TOTALES")
+    parser.add_argument("--bajo-consumo", action="store_true",
+                        help="libera cada página tras procesarla (extraer_balance(bajo_consumo=True))")
+    parser.add_argument("--salida", default="-", help="archivo JSON de resultados ('-' = stdout)")
+    args = parser.parse_args(argv)
+
+    casos = [
+        {"paginas": paginas, "cuentas_por_pagina": cuentas, "motor": motor,
+         "formato": formato, "encabezado_por_pagina": not args.sin_encabezado,
+         "bajo_consumo": args.bajo_consumo, "paginas_firma": args.paginas_firma}
+        for paginas in args.paginas
+        for cuentas in args.cuentas_por_pagina
+        for motor in args.motor
+        for formato in args.formato
+    ]
+    informe = {
+        "version_extractor": extractor.VERSION_EXTRACTOR,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "casos": ejecutar(casos),
+    }
+    texto = json.dumps(informe, ensure_ascii=False, indent=2)
+    if args.salida == "-":
+        print(texto)
+    else:
+        Path(args.salida).write_text(texto, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
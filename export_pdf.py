@@ -8,9 +8,7 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 
 from regimen_14d3 import (
-    construir_lineas_ingresos,
-    construir_lineas_egresos,
-    construir_lineas_gastos_rechazados,
+    construir_lineas,
     CODIGOS_INGRESOS_GIRO,
     CODIGOS_EXISTENCIAS,
     CODIGOS_REMUNERACIONES,
@@ -49,6 +47,10 @@ def generar_pdf(resultado, modo: str) -> bytes:
     elim_ing  = set(st.session_state.get("eliminadas_ing", []))
     elim_egr  = set(st.session_state.get("eliminadas_egr", []))
     elim_gst  = set(st.session_state.get("eliminadas_gst", []))
+    lineas    = construir_lineas(cuentas,
+                                 st.session_state.get("extras_ingresos", []),
+                                 st.session_state.get("extras_egresos", []),
+                                 st.session_state.get("extras_gastos", []))
 
     azul       = colors.HexColor("#2c5282")
     azul_claro = colors.HexColor("#dbeafe")
@@ -100,7 +102,7 @@ def generar_pdf(resultado, modo: str) -> bytes:
 
     # ── I. INGRESOS ─────────────────────────────────────────────────────────
     story.append(Paragraph("I. INGRESOS DEL EJERCICIO", h2))
-    lineas_ing = construir_lineas_ingresos(cuentas, st.session_state.get("extras_ingresos", []))
+    lineas_ing = lineas["ingresos"]
     filas_ing = []
     giro_bloque = []   # acumula filas de ingresos del giro mientras se procesan
     giro_total  = 0
@@ -162,7 +164,7 @@ def generar_pdf(resultado, modo: str) -> bytes:
 
     # ── II. EGRESOS ─────────────────────────────────────────────────────────
     story.append(Paragraph("II. EGRESOS DEL EJERCICIO", h2))
-    lineas_egr = construir_lineas_egresos(cuentas, st.session_state.get("extras_egresos", []))
+    lineas_egr = lineas["egresos"]
     filas_egr  = []
     exist_bloque = []
     exist_total  = 0
@@ -291,7 +293,7 @@ def generar_pdf(resultado, modo: str) -> bytes:
 
     # ── III. GASTOS RECHAZADOS ───────────────────────────────────────────────
     story.append(Paragraph("III. GASTOS RECHAZADOS", h2))
-    lineas_gst = construir_lineas_gastos_rechazados(cuentas, st.session_state.get("extras_gastos", []))
+    lineas_gst = lineas["gastos_rechazados"]
     filas_gst  = []
     for idx, l in enumerate(lineas_gst):
         if l.codigo in elim_gst:
@@ -5,8 +5,28 @@ Extracción de datos desde un Balance de 8 columnas en formato PDF.
 Retorna diccionario de cuentas y datos de empresa.
 """
 
+import argparse
+import hashlib
+import io
+import mmap
+import os
 import re
+import sys
+import time
+import zlib
+import json
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field
+from operator import itemgetter
+from pathlib import Path
+from typing import Iterator
+
 import pdfplumber
+import pypdfium2
 
 
 # ---------------------------------------------------------------------------
@@ -20,13 +40,273 @@ _PERIODO_PATTERN = re.compile(
 )
 _CODIGO_PATTERN = re.compile(r"^\d{6}$")
 
+# Versión del extractor: forma parte de la clave de caché, por lo que debe
+# incrementarse cada vez que cambie el resultado de extraer_balance.
+VERSION_EXTRACTOR = "9"
 
-def _fmt_numero(texto: str) -> int:
-    """Convierte string con puntos como miles a entero."""
-    if not texto:
-        return 0
-    limpio = re.sub(r"[^\d]", "", texto)
-    return int(limpio) if limpio else 0
+# Columnas numéricas del balance, en el orden en que aparecen en el PDF
+COLUMNAS_NUMERICAS = ("debitos", "creditos", "saldo_deudor", "saldo_acreedor",
+                      "activos", "pasivos", "perdidas", "ganancias")
+
+# Primera palabra de las filas de cierre del balance → clave en TablaBalance.totales.
+# La fila TOTALES que sigue a la fila SUMAS marca el fin de la tabla: las
+# páginas siguientes (firmas, notas) no se procesan salvo que se pida
+# explícitamente. Una fila TOTALES antes de SUMAS (total de traspaso al pie
+# de cada página) no detiene la extracción.
+_ETIQUETAS_TOTALES = {
+    "SUMAS": "SUMAS",
+    "RESULTADO": "RESULTADO",
+    "UTILIDAD": "RESULTADO",
+    "PERDIDA": "RESULTADO",
+    "PÉRDIDA": "RESULTADO",
+    "TOTALES": "TOTALES",
+}
+
+# Prioridad para el monto representativo de una cuenta (get_valor sin columna)
+COLUMNAS_PRIORIDAD = ("ganancias", "perdidas", "activos", "pasivos",
+                      "saldo_acreedor", "saldo_deudor")
+
+
+# ---------------------------------------------------------------------------
+# Estructuras de datos
+# ---------------------------------------------------------------------------
+@dataclass
+class FilaBalance:
+    """Una fila de cuenta tal como aparece en una página del balance."""
+    pagina: int                    # índice de página (0 = primera)
+    codigo: str                    # "" en filas de totales
+    cuenta: str                    # nombre de la cuenta, o SUMAS / RESULTADO / TOTALES
+    montos: dict = field(default_factory=dict)   # {columna: monto > 0}
+    tipo: str = "cuenta"           # "cuenta" | "total"
+
+    def como_registro(self) -> dict:
+        """Registro en el formato de extraer_balance: {"cuenta": ..., columna: monto}."""
+        return {"cuenta": self.cuenta, **self.montos}
+
+
+class TablaBalance(Mapping):
+    """
+    Cuentas del balance en forma compacta: un índice código → fila, nombres
+    internados y las 8 columnas numéricas en arrays contiguos de enteros.
+
+    Se comporta como el dict {codigo: {"cuenta": ..., columna: monto}} que
+    retornaba extraer_balance: tabla[codigo] entrega una vista de solo
+    lectura con "cuenta" y las columnas con monto > 0.
+    """
+
+    def __init__(self):
+        self._indice: dict[str, int] = {}
+        self._codigos: list[str] = []
+        self._nombres: list[str] = []
+        self._montos = {col: array("q") for col in COLUMNAS_NUMERICAS}
+        # Monto representativo por fila y su columna de origen (índice en
+        # COLUMNAS_PRIORIDAD, -1 si no tiene). None = pendiente de indexar.
+        self._principal: array | None = None
+        self._col_principal: array | None = None
+        # Filas de cierre del balance: {"SUMAS" | "RESULTADO" | "TOTALES": {columna: monto}}
+        self.totales: dict[str, dict] = {}
+        self._huella: str | None = None
+
+    def acumular(self, codigo: str, nombre: str, montos: dict):
+        """Agrega la cuenta o suma sus montos si ya existe (el nombre es el de la primera aparición)."""
+        self._principal = self._col_principal = self._huella = None
+        i = self._indice.get(codigo)
+        if i is None:
+            i = len(self._codigos)
+            self._indice[codigo] = i
+            self._codigos.append(codigo)
+            self._nombres.append(sys.intern(nombre))
+            for columna in self._montos.values():
+                columna.append(0)
+        for col, valor in montos.items():
+            self._montos[col][i] += valor
+
+    def valor(self, codigo: str, columna: str) -> int:
+        """Monto de la cuenta en la columna; 0 si la cuenta o la columna no existen."""
+        i = self._indice.get(codigo)
+        montos = self._montos.get(columna)
+        return 0 if i is None or montos is None else montos[i]
+
+    def nombre(self, codigo: str) -> str:
+        i = self._indice.get(codigo)
+        return "" if i is None else self._nombres[i]
+
+    def leer(self, codigo: str, columna: str) -> tuple[bool, str, int]:
+        """(existe, nombre, monto en la columna) con una sola búsqueda del código."""
+        i = self._indice.get(codigo)
+        if i is None:
+            return False, "", 0
+        montos = self._montos.get(columna)
+        return True, self._nombres[i], 0 if montos is None else montos[i]
+
+    def principal(self, codigo: str) -> tuple[int, str | None]:
+        """(monto representativo, columna de origen) según COLUMNAS_PRIORIDAD; (0, None) si no hay."""
+        i = self._indice.get(codigo)
+        if i is None:
+            return 0, None
+        if self._principal is None:
+            self.indexar()
+        k = self._col_principal[i]
+        return self._principal[i], (COLUMNAS_PRIORIDAD[k] if k >= 0 else None)
+
+    def indexar(self):
+        """Calcula en una pasada el monto representativo de todas las cuentas."""
+        n = len(self._codigos)
+        principal = array("q", bytes(8 * n))
+        col_principal = array("b", b"\xff" * n)       # -1 = sin monto
+        for k in reversed(range(len(COLUMNAS_PRIORIDAD))):
+            # De menor a mayor prioridad: cada columna con monto sobrescribe
+            columna = self._montos[COLUMNAS_PRIORIDAD[k]]
+            for i in range(n):
+                if columna[i] > 0:
+                    principal[i] = columna[i]
+                    col_principal[i] = k
+        self._principal, self._col_principal = principal, col_principal
+
+    def huella(self) -> str:
+        """SHA-256 de códigos, nombres y montos; se recalcula solo si la tabla cambia."""
+        if self._huella is None:
+            h = hashlib.sha256()
+            h.update("\0".join(self._codigos).encode("utf-8"))
+            h.update(b"\1")
+            h.update("\0".join(self._nombres).encode("utf-8"))
+            for col in COLUMNAS_NUMERICAS:
+                h.update(self._montos[col].tobytes())
+            self._huella = h.hexdigest()
+        return self._huella
+
+    def como_dict(self) -> dict:
+        return {codigo: dict(self[codigo]) for codigo in self._codigos}
+
+    # --- Interfaz Mapping ---------------------------------------------------
+    def __getitem__(self, codigo: str) -> "_VistaCuenta":
+        return _VistaCuenta(self, self._indice[codigo])
+
+    def __contains__(self, codigo) -> bool:
+        return codigo in self._indice
+
+    def __iter__(self):
+        return iter(self._codigos)
+
+    def __len__(self) -> int:
+        return len(self._codigos)
+
+    def __repr__(self) -> str:
+        return f"TablaBalance({len(self)} cuentas)"
+
+
+class _VistaCuenta(Mapping):
+    """Registro de una cuenta de TablaBalance con la forma {"cuenta": ..., columna: monto}."""
+    __slots__ = ("_tabla", "_i")
+
+    def __init__(self, tabla: TablaBalance, i: int):
+        self._tabla = tabla
+        self._i = i
+
+    def __getitem__(self, clave: str):
+        if clave == "cuenta":
+            return self._tabla._nombres[self._i]
+        columna = self._tabla._montos.get(clave)
+        if columna is None or columna[self._i] <= 0:
+            raise KeyError(clave)
+        return columna[self._i]
+
+    def __iter__(self):
+        yield "cuenta"
+        for col, columna in self._tabla._montos.items():
+            if columna[self._i] > 0:
+                yield col
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+@dataclass
+class InformeExtraccion:
+    """
+    Tiempos (segundos) y conteos por etapa de una extracción. Se pasa vacío
+    a extraer_balance(informe=...) y se completa durante la extracción.
+    Etapas: preverificacion, abrir, texto_p1, extract_words, agrupar_y, columnas,
+    asignar_filas.
+    """
+    motor: str = ""
+    productor: str = ""            # metadato Producer / Creator del PDF
+    n_paginas: int = 0
+    cuentas: int = 0
+    desde_cache: bool = False
+    respaldo_pdfplumber: bool = False   # motor "auto" que recurrió a pdfplumber
+    plantilla: str = ""            # huella de la plantilla de layout usada, si hubo
+    peak_rss_mb: float = 0.0       # máximo RSS observado entre páginas (modo bajo_consumo)
+    etapas: dict = field(default_factory=dict)    # {etapa: segundos acumulados}
+    paginas: list = field(default_factory=list)   # un dict por página procesada
+
+    def como_dict(self) -> dict:
+        return asdict(self)
+
+    def resumen(self) -> str:
+        """Una línea apta para logs."""
+        etapas = " ".join(f"{k}={v:.3f}s" for k, v in self.etapas.items())
+        return (f"motor={self.motor} productor={self.productor!r} paginas={self.n_paginas} "
+                f"cuentas={self.cuentas} cache={self.desde_cache} "
+                f"plantilla={self.plantilla[:8] or '-'} {etapas}")
+
+
+@contextmanager
+def _cronometro(informe: "InformeExtraccion | None", etapa: str, pagina: dict | None = None):
+    """Acumula el tiempo del bloque en informe.etapas (y en el dict de la página)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        informe.etapas[etapa] = informe.etapas.get(etapa, 0.0) + dt
+        if pagina is not None:
+            pagina[etapa] = pagina.get(etapa, 0.0) + dt
+
+
+def _medir(informe: "InformeExtraccion | None", etapa: str, pagina: dict | None = None):
+    return nullcontext() if informe is None else _cronometro(informe, etapa, pagina)
+
+
+@dataclass
+class LayoutColumnas:
+    """
+    Posiciones X de las columnas, detectadas una vez por documento.
+    Se reutiliza en las páginas siguientes mientras no cambie la geometría
+    de página (ancho × alto).
+    """
+    geometria: tuple[int, int]
+    cols: dict                     # {nombre_col: x_centro}
+    desde_encabezado: bool         # False si es estimación por ancho de página
+    huella: str | None = None      # huella del layout (ver "Plantillas de layout")
+    desde_plantilla: bool = False  # True si cols viene de una plantilla registrada
+    nombres_numericas: list = field(init=False, repr=False)
+    limites: list = field(init=False, repr=False)
+
+    def __post_init__(self):
+        # Modelo de columnas numéricas: centros ordenados por X y límites en
+        # los puntos medios entre centros consecutivos. Un valor pertenece a
+        # la columna i si limites[i-1] <= x < limites[i].
+        centros = sorted((self.cols[k], k) for k in COLUMNAS_NUMERICAS if k in self.cols)
+        self.nombres_numericas = [k for _, k in centros]
+        self.limites = [(a + b) / 2 for (a, _), (b, _) in zip(centros, centros[1:])]
+
+    def asignar(self, xs: list[float]) -> list[str | None]:
+        """Asigna cada posición X a la columna numérica más cercana (búsqueda binaria)."""
+        if not self.nombres_numericas:
+            return [None] * len(xs)
+        nombres, limites = self.nombres_numericas, self.limites
+        return [nombres[bisect_left(limites, x)] for x in xs]
+
+
+# Palabras de los encabezados de columna de la tabla
+_PALABRAS_ENCABEZADO = frozenset((
+    "CODIGO", "CUENTA", "DEBITOS", "CREDITOS", "DEUDOR", "ACREEDOR",
+    "ACTIVOS", "PASIVOS", "PERDIDAS", "GANANCIAS", "SALDO",
+))
 
 
 def _detectar_columnas_x(words: list[dict]) -> dict:
@@ -35,9 +315,7 @@ def _detectar_columnas_x(words: list[dict]) -> dict:
     a partir de los encabezados de la tabla.
     Retorna dict: {nombre_col: x_centro}
     """
-    header_words = [w for w in words if w["text"].upper() in
-                    ("CODIGO", "CUENTA", "DEBITOS", "CREDITOS", "DEUDOR", "ACREEDOR",
-                     "ACTIVOS", "PASIVOS", "PERDIDAS", "GANANCIAS", "SALDO")]
+    header_words = [w for w in words if w["text"].upper() in _PALABRAS_ENCABEZADO]
     if not header_words:
         return {}
     cols = {}
@@ -67,20 +345,45 @@ def _detectar_columnas_x(words: list[dict]) -> dict:
     return cols
 
 
-def _asignar_columna(x: float, cols: dict) -> str | None:
-    """Devuelve la columna más cercana al valor x dado."""
-    if not cols:
-        return None
-    return min(cols, key=lambda k: abs(cols[k] - x))
-
-
-def extraer_balance(pdf_path: str) -> tuple[dict, dict]:
+def extraer_balance(pdf_source, usar_cache: bool = False,
+                    procesos: int = 1, motor: str = "pdfplumber",
+                    informe: InformeExtraccion | None = None,
+                    bajo_consumo: bool = False,
+                    paginas_tras_totales: bool = False,
+                    verificar_texto: bool = True,
+                    usar_plantillas: bool = False) -> tuple[TablaBalance, dict]:
     """
     Extrae cuentas y datos de empresa desde un PDF de balance de 8 columnas.
+    pdf_source puede ser una ruta (se lee mediante memory map) o el PDF en
+    memoria como bytes, bytearray, memoryview o BytesIO (sin copiarlo).
+    Con usar_cache=True el resultado se lee/guarda en la caché persistente
+    (ver sección "Caché persistente de extracción").
+    Con procesos > 1 las páginas se reparten en rangos entre un pool de
+    procesos; el resultado es idéntico al de la extracción secuencial.
+    motor elige el backend de texto: "pdfplumber", "pdfium" o "auto"
+    (pdfium, y pdfplumber si pdfium no encuentra códigos de 6 dígitos).
+    Si se entrega un InformeExtraccion, se completa con tiempos y conteos
+    por etapa y por página.
+    Con bajo_consumo=True se liberan los caches de layout de cada página
+    apenas se procesa, de modo que la memoria no crece con el número de
+    páginas; el informe registra el RSS máximo observado.
+    La extracción termina en la página con la fila TOTALES de cierre (la
+    primera después de la fila SUMAS); con paginas_tras_totales=True se
+    procesan también las páginas siguientes.
+    Las filas SUMAS / RESULTADO / TOTALES quedan en cuentas.totales (ver
+    verificar_totales).
+    Con verificar_texto=True (por defecto) se comprueba antes de extraer que
+    el PDF tenga capa de texto; un escaneo lanza PDFSinTextoError sin
+    recorrer sus páginas (ver diagnosticar_texto).
+    Con usar_plantillas=True el layout de columnas se toma del registro de
+    plantillas por software contable cuando la huella del documento es
+    conocida, y se registra al terminar si el balance cuadra (ver sección
+    "Plantillas de layout por software contable").
 
     Returns
     -------
-    cuentas : dict
+    cuentas : TablaBalance
+        Mapping compatible con el dict
         {
           "300101": {"cuenta": "VENTAS", "ganancias": 222137351},
           "400101": {"cuenta": "COSTO DE VENTAS", "perdidas": 113358745},
@@ -89,7 +392,62 @@ def extraer_balance(pdf_path: str) -> tuple[dict, dict]:
     empresa : dict
         {razon_social, rut, giro, direccion, comuna, periodo}
     """
-    cuentas: dict = {}
+    if motor not in MOTORES:
+        raise ValueError(f"Motor de extracción desconocido: {motor!r}")
+
+    if usar_cache:
+        with _buffer_pdf(pdf_source) as buffer:
+            clave = f"{hashlib.sha256(buffer).hexdigest()}-{motor}"
+        if paginas_tras_totales:
+            clave += "-completo"
+        with _medir(informe, "cache"):
+            en_cache = leer_cache(clave)
+        # Un resultado vacío nunca se guarda (ver abajo); se ignoran las
+        # entradas vacías que hubiera dejado una versión anterior.
+        if en_cache is not None and en_cache[0]:
+            if informe is not None:
+                informe.desde_cache = True
+                informe.cuentas = len(en_cache[0])
+            return en_cache
+        cuentas, empresa = extraer_balance(pdf_source, procesos=procesos, motor=motor,
+                                           informe=informe, bajo_consumo=bajo_consumo,
+                                           paginas_tras_totales=paginas_tras_totales,
+                                           verificar_texto=verificar_texto,
+                                           usar_plantillas=usar_plantillas)
+        # La clave no incluye verificar_texto: un escaneo extraído con
+        # verificar_texto=False daría una tabla vacía que, en caché, ocultaría
+        # el PDFSinTextoError de las llamadas siguientes.
+        if cuentas:
+            guardar_cache(clave, cuentas, empresa)
+        return cuentas, empresa
+
+    if verificar_texto:
+        with _medir(informe, "preverificacion"):
+            diagnostico = diagnosticar_texto(pdf_source)
+        if not diagnostico.tiene_texto:
+            raise PDFSinTextoError(diagnostico.motivo)
+
+    if motor == "auto":
+        cuentas, empresa = extraer_balance(pdf_source, procesos=procesos, motor="pdfium",
+                                           informe=informe, bajo_consumo=bajo_consumo,
+                                           paginas_tras_totales=paginas_tras_totales,
+                                           verificar_texto=False,
+                                           usar_plantillas=usar_plantillas)
+        if cuentas:
+            return cuentas, empresa
+        if informe is not None:
+            informe.respaldo_pdfplumber = True
+            informe.paginas.clear()
+        return extraer_balance(pdf_source, procesos=procesos, motor="pdfplumber",
+                               informe=informe, bajo_consumo=bajo_consumo,
+                               paginas_tras_totales=paginas_tras_totales,
+                               verificar_texto=False,
+                               usar_plantillas=usar_plantillas)
+
+    if informe is not None:
+        informe.motor = motor
+
+    cuentas = TablaBalance()
     empresa = {
         "razon_social": "",
         "rut": "",
@@ -99,16 +457,537 @@ def extraer_balance(pdf_path: str) -> tuple[dict, dict]:
         "periodo": "",
     }
 
-    with pdfplumber.open(pdf_path) as pdf:
-        full_text_p1 = pdf.pages[0].extract_text() or ""
-        _extraer_datos_empresa(full_text_p1, empresa)
+    with _abrir_pdf(pdf_source, motor, informe) as pdf:
+        with _medir(informe, "texto_p1"):
+            full_text_p1 = pdf.pages[0].extract_text() or ""
+            _extraer_datos_empresa(full_text_p1, empresa)
 
-        for page in pdf.pages:
-            _extraer_cuentas_pagina(page, cuentas)
+        n_paginas = len(pdf.pages)
+        productor = _productor(pdf)
+        if procesos <= 1 or n_paginas < 2:
+            layout_final: list = []
+            for fila in _iter_filas_paginas(pdf.pages, 0, informe=informe,
+                                            bajo_consumo=bajo_consumo,
+                                            paginas_tras_totales=paginas_tras_totales,
+                                            productor=productor,
+                                            plantillas=usar_plantillas,
+                                            layout_final=layout_final):
+                if fila.tipo == "total":
+                    cuentas.totales[fila.cuenta] = fila.montos
+                else:
+                    cuentas.acumular(fila.codigo, fila.cuenta, fila.montos)
+            if usar_plantillas and layout_final:
+                _confirmar_plantilla(layout_final[0], cuentas.totales, productor)
+            cuentas.indexar()
+            if informe is not None:
+                informe.cuentas = len(cuentas)
+            return cuentas, empresa
 
+    # Modo paralelo: cada worker abre su propio handle del PDF y
+    # devuelve un dict parcial por página; se fusionan en orden de página
+    # con la misma regla de acumulación que la extracción secuencial.
+    procesos = min(procesos, n_paginas)
+    paso = -(-n_paginas // procesos)
+    rangos = [(i, min(i + paso, n_paginas)) for i in range(0, n_paginas, paso)]
+    # El layout se detecta aquí y se entrega a todos los workers, para que
+    # los rangos que comienzan en páginas sin encabezado usen las mismas columnas.
+    # Los PDF en memoria se envían como bytes a cada worker; las rutas se
+    # mapean de nuevo en cada proceso.
+    with _abrir_pdf(pdf_source, motor) as pdf:
+        layout = _layout_inicial(pdf, plantillas=usar_plantillas)
+    if informe is not None and layout is not None and layout.desde_plantilla:
+        informe.plantilla = layout.huella
+    if not isinstance(pdf_source, (str, os.PathLike)):
+        with _buffer_pdf(pdf_source) as buffer:
+            pdf_source = bytes(buffer)
+    # Un worker solo sabe si vio SUMAS dentro de su rango, así que el cierre
+    # lo decide el proceso padre al recorrer las páginas en orden, con la
+    # misma regla que _iter_filas_paginas.
+    sumas_vista = False
+    with ProcessPoolExecutor(max_workers=len(rangos)) as pool:
+        futuros = [pool.submit(_extraer_rango_paginas, pdf_source, ini, fin, layout, motor,
+                               informe is not None, bajo_consumo, paginas_tras_totales,
+                               usar_plantillas)
+                   for ini, fin in rangos]
+        for futuro, (ini, _) in zip(futuros, rangos):
+            parciales, totales_paginas, informe_rango, layout_rango = futuro.result()
+            layout = layout_rango or layout
+            cierre = None
+            for n, (parcial, totales) in enumerate(zip(parciales, totales_paginas), ini):
+                for codigo, registro in parcial.items():
+                    cuentas.acumular(codigo, registro.pop("cuenta"), registro)
+                cuentas.totales.update(totales)
+                sumas_vista = sumas_vista or "SUMAS" in totales
+                if not paginas_tras_totales and sumas_vista and "TOTALES" in totales:
+                    cierre = n
+                    break
+            if informe is not None:
+                # Los tiempos por etapa de los workers se suman (tiempo de CPU
+                # agregado, no tiempo de pared del modo paralelo).
+                for etapa, seg in informe_rango.etapas.items():
+                    informe.etapas[etapa] = informe.etapas.get(etapa, 0.0) + seg
+                informe.paginas.extend(p for p in informe_rango.paginas
+                                       if cierre is None or p["pagina"] <= cierre)
+                informe.peak_rss_mb = max(informe.peak_rss_mb, informe_rango.peak_rss_mb)
+            if cierre is not None:
+                # Página con la fila TOTALES de cierre: el resto se descarta
+                for pendiente in futuros:
+                    pendiente.cancel()
+                break
+
+    # La plantilla se confirma con los totales de todos los rangos: SUMAS y
+    # TOTALES pueden quedar en rangos distintos.
+    if usar_plantillas and layout is not None:
+        _confirmar_plantilla(layout, cuentas.totales, productor)
+    cuentas.indexar()
+    if informe is not None:
+        informe.cuentas = len(cuentas)
     return cuentas, empresa
 
 
+def _extraer_rango_paginas(pdf_source, inicio: int, fin: int,
+                           layout: "LayoutColumnas | None" = None,
+                           motor: str = "pdfplumber",
+                           instrumentar: bool = False,
+                           bajo_consumo: bool = False,
+                           paginas_tras_totales: bool = False,
+                           plantillas: bool = False) -> tuple:
+    """
+    Worker del modo paralelo. Retorna (parciales, totales, informe, layout):
+    un dict de cuentas y un dict de filas de totales por cada página del
+    rango, si instrumentar es True el informe de esas páginas, y el layout
+    vigente al terminar el rango. El rango se detiene en la fila TOTALES
+    solo si vio SUMAS dentro de él; el cierre del documento lo decide
+    extraer_balance. Los workers no confirman plantillas: solo ven los
+    totales de su rango.
+    """
+    informe = InformeExtraccion(motor=motor) if instrumentar else None
+    parciales = [{} for _ in range(inicio, fin)]
+    totales = [{} for _ in range(inicio, fin)]
+    layout_final: list = []
+    with _abrir_pdf(pdf_source, motor, informe) as pdf:
+        for fila in _iter_filas_paginas(pdf.pages[inicio:fin], inicio, layout, informe,
+                                        bajo_consumo, paginas_tras_totales,
+                                        _productor(pdf), plantillas, layout_final):
+            if fila.tipo == "total":
+                totales[fila.pagina - inicio][fila.cuenta] = fila.montos
+            else:
+                _acumular_cuenta(parciales[fila.pagina - inicio], fila.codigo, fila.como_registro())
+    return parciales, totales, informe, (layout_final[0] if layout_final else None)
+
+
+def iter_filas_balance(pdf_source, motor: str = "pdfplumber",
+                       bajo_consumo: bool = True,
+                       paginas_tras_totales: bool = False,
+                       verificar_texto: bool = True,
+                       usar_plantillas: bool = False) -> Iterator[FilaBalance]:
+    """
+    Itera las filas de cuentas del balance página a página, a medida que se
+    parsean. Una cuenta que aparece en varias páginas se entrega una vez
+    por página; extraer_balance acumula esas filas en un solo registro.
+    Las filas SUMAS / RESULTADO / TOTALES se entregan con tipo="total" y la
+    iteración termina en la página de la fila TOTALES de cierre, salvo
+    paginas_tras_totales=True.
+    La iteración no vuelve sobre páginas anteriores, así que por defecto
+    (bajo_consumo=True) cada página se libera antes de entregar sus filas y
+    la memoria queda acotada a una página; bajo_consumo=False conserva las
+    páginas abiertas hasta terminar.
+    Con verificar_texto=True un PDF sin capa de texto lanza PDFSinTextoError
+    antes de entregar la primera fila.
+    usar_plantillas tiene el mismo efecto que en extraer_balance.
+    """
+    if motor not in MOTORES:
+        raise ValueError(f"Motor de extracción desconocido: {motor!r}")
+    if verificar_texto:
+        diagnostico = diagnosticar_texto(pdf_source)
+        if not diagnostico.tiene_texto:
+            raise PDFSinTextoError(diagnostico.motivo)
+    if motor == "auto":
+        hubo_filas = False
+        for fila in iter_filas_balance(pdf_source, "pdfium", bajo_consumo, paginas_tras_totales,
+                                       verificar_texto=False, usar_plantillas=usar_plantillas):
+            hubo_filas = True
+            yield fila
+        if not hubo_filas:
+            yield from iter_filas_balance(pdf_source, "pdfplumber", bajo_consumo,
+                                          paginas_tras_totales, verificar_texto=False,
+                                          usar_plantillas=usar_plantillas)
+        return
+
+    with _abrir_pdf(pdf_source, motor) as pdf:
+        productor = _productor(pdf)
+        layout_final: list = []
+        totales: dict[str, dict] = {}
+        for fila in _iter_filas_paginas(pdf.pages, 0, bajo_consumo=bajo_consumo,
+                                        paginas_tras_totales=paginas_tras_totales,
+                                        productor=productor,
+                                        plantillas=usar_plantillas,
+                                        layout_final=layout_final):
+            if fila.tipo == "total":
+                totales[fila.cuenta] = fila.montos
+            yield fila
+        if usar_plantillas and layout_final:
+            _confirmar_plantilla(layout_final[0], totales, productor)
+
+
+def _iter_filas_paginas(pages, inicio: int,
+                        layout: "LayoutColumnas | None" = None,
+                        informe: InformeExtraccion | None = None,
+                        bajo_consumo: bool = False,
+                        paginas_tras_totales: bool = False,
+                        productor: str = "",
+                        plantillas: bool = False,
+                        layout_final: list | None = None) -> Iterator[FilaBalance]:
+    """
+    Recorre páginas consecutivas (la primera con índice inicio) manteniendo
+    el layout. Se detiene tras la página con una fila TOTALES, si ya se vio
+    la fila SUMAS en esa página o en una anterior, salvo
+    paginas_tras_totales=True.
+    Con plantillas=True el layout se busca en el registro de plantillas. Si
+    se entrega la lista layout_final, queda con el layout vigente tras cada
+    página, para que quien reúne los totales del documento confirme la
+    plantilla (ver _confirmar_plantilla).
+    """
+    sumas_vista = False
+    for n, page in enumerate(pages, inicio):
+        pagina = {"pagina": n} if informe is not None else None
+        with _medir(informe, "extract_words", pagina):
+            words = page.extract_words(x_tolerance=3, y_tolerance=3)
+        if words:
+            with _medir(informe, "columnas", pagina):
+                layout = _resolver_layout(page, words, layout, productor, plantillas)
+            if informe is not None and layout.desde_plantilla:
+                informe.plantilla = layout.huella
+        if layout_final is not None:
+            layout_final[:] = [layout]
+        if words:
+            filas = _filas_pagina(words, layout, n, informe, pagina)
+        else:
+            filas = []
+        if pagina is not None:
+            pagina["palabras"] = len(words)
+            pagina["cuentas"] = len(filas)
+            informe.paginas.append(pagina)
+        if bajo_consumo:
+            # Liberar chars/words/layout de la página antes de seguir
+            del words
+            page.close()
+            if pagina is not None:
+                pagina["rss_mb"] = _rss_mb()
+                informe.peak_rss_mb = max(informe.peak_rss_mb, pagina["rss_mb"])
+        yield from filas
+        cierres = {f.cuenta for f in filas if f.tipo == "total"}
+        sumas_vista = sumas_vista or "SUMAS" in cierres
+        if not paginas_tras_totales and sumas_vista and "TOTALES" in cierres:
+            return
+
+
+def _rss_mb() -> float:
+    """RSS actual del proceso en MB (Linux); en otros sistemas, el máximo histórico."""
+    try:
+        with open("/proc/self/statm") as f:
+            paginas_residentes = int(f.read().split()[1])
+        return round(paginas_residentes * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource  # no existe en Windows
+    except ImportError:
+        return 0.0
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(maxrss / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def _geometria(page) -> tuple[int, int]:
+    return round(float(page.width)), round(float(page.height))
+
+
+def _layout_vigente(layout: "LayoutColumnas | None", page) -> bool:
+    """True si el layout viene de encabezados y la geometría de página no cambió."""
+    return (layout is not None and layout.desde_encabezado
+            and layout.geometria == _geometria(page))
+
+
+def _resolver_layout(page, words: list[dict],
+                     layout: "LayoutColumnas | None",
+                     productor: str = "",
+                     plantillas: bool = False) -> LayoutColumnas:
+    """
+    Retorna el layout a usar en la página. Un layout detectado desde
+    encabezados se reutiliza sin volver a buscar encabezados mientras la
+    geometría de página sea la misma; una estimación por ancho se mantiene
+    solo hasta encontrar una página con encabezado.
+    Con plantillas=True, un encabezado cuya huella ya está registrada toma
+    las columnas de la plantilla sin detectarlas.
+    """
+    if _layout_vigente(layout, page):
+        return layout
+
+    geometria = _geometria(page)
+    huella = _huella_layout(productor, geometria, words) if plantillas else None
+    plantilla = leer_plantilla(huella) if huella else None
+    if plantilla is not None:
+        return LayoutColumnas(geometria, plantilla["cols"], desde_encabezado=True,
+                              huella=huella, desde_plantilla=True)
+    cols = _detectar_columnas_x(words)
+    if len(cols) >= 4:
+        return LayoutColumnas(geometria, cols, desde_encabezado=True, huella=huella)
+    if layout is not None and layout.geometria == geometria:
+        return layout
+    # Columnas numéricas en orden esperado (fallback por posición relativa)
+    return LayoutColumnas(geometria, _estimar_columnas_por_posicion(page), desde_encabezado=False)
+
+
+def _layout_inicial(pdf, max_paginas: int = 3,
+                    plantillas: bool = False) -> "LayoutColumnas | None":
+    """Busca el layout del documento en las primeras páginas con encabezado."""
+    layout = None
+    productor = _productor(pdf)
+    for page in pdf.pages[:max_paginas]:
+        words = page.extract_words(x_tolerance=3, y_tolerance=3)
+        if not words:
+            continue
+        layout = _resolver_layout(page, words, layout, productor, plantillas)
+        if layout.desde_encabezado:
+            break
+    return layout
+
+
+# ---------------------------------------------------------------------------
+# Backends de texto
+# ---------------------------------------------------------------------------
+# El pipeline trabaja sobre la interfaz de página de pdfplumber (width,
+# height, extract_words, extract_text). El backend pdfium la
+# imita con las cajas de caracteres del API nativo de texto de pdfium, que
+# evita el análisis de layout en Python puro de pdfminer.
+MOTORES = ("pdfplumber", "pdfium", "auto")
+
+
+@contextmanager
+def _abrir_pdf(pdf_source, motor: str, informe: InformeExtraccion | None = None):
+    """Abre el PDF con el backend indicado; el documento expone .pages y .metadata."""
+    with _buffer_pdf(pdf_source) as buffer:
+        lector = _LectorMemoria(buffer)
+        try:
+            with _medir(informe, "abrir"):
+                if motor == "pdfium":
+                    doc = _DocumentoPdfium(lector)
+                else:
+                    doc = pdfplumber.open(lector)
+            if informe is not None:
+                informe.productor = _productor(doc)
+                informe.n_paginas = len(doc.pages)
+            with doc:
+                yield doc
+        finally:
+            lector.close()
+
+
+def _productor(doc) -> str:
+    """Metadato Producer (o Creator) del documento abierto con _abrir_pdf."""
+    metadata = doc.metadata or {}
+    return str(metadata.get("Producer") or metadata.get("Creator") or "")
+
+
+@contextmanager
+def _buffer_pdf(pdf_source):
+    """
+    Entrega el contenido del PDF como buffer sin copiarlo: las rutas se
+    mapean en memoria (mmap), BytesIO expone su buffer interno y bytes /
+    bytearray / memoryview se usan directamente.
+    """
+    if isinstance(pdf_source, (str, os.PathLike)):
+        if os.path.getsize(pdf_source) == 0:
+            raise ValueError(f"El archivo PDF está vacío: {os.fspath(pdf_source)}")
+        with open(pdf_source, "rb") as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            yield mapa
+    elif isinstance(pdf_source, io.BytesIO):
+        vista = pdf_source.getbuffer()
+        try:
+            yield vista
+        finally:
+            vista.release()
+    else:
+        with memoryview(pdf_source) as vista:
+            yield vista
+
+
+class _LectorMemoria(io.RawIOBase):
+    """Stream de solo lectura sobre un buffer, aceptado por pdfplumber y pdfium."""
+
+    def __init__(self, buffer):
+        self._vista = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), len(self._vista) - self._pos))
+        b[:n] = self._vista[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._vista)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._vista.release()
+        super().close()
+
+
+class _DocumentoPdfium:
+    def __init__(self, lector: _LectorMemoria):
+        self._doc = pypdfium2.PdfDocument(lector)
+        self.pages = [_PaginaPdfium(self._doc, i) for i in range(len(self._doc))]
+
+    @property
+    def metadata(self) -> dict:
+        return self._doc.get_metadata_dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for page in self.pages:
+            page.close()
+        self._doc.close()
+
+
+class _PaginaPdfium:
+    """Página pdfium con la parte de la interfaz de pdfplumber.Page que usa el extractor."""
+
+    def __init__(self, doc, indice: int):
+        self._doc = doc
+        self._indice = indice
+        self._page = None
+        self._words = None
+        self.width, self.height = doc.get_page_size(indice)
+
+    def extract_words(self, x_tolerance: float = 3, y_tolerance: float = 3) -> list[dict]:
+        if self._words is None:
+            self._words = self._leer_palabras(x_tolerance, y_tolerance)
+        return self._words
+
+    def extract_text(self) -> str:
+        """Texto por líneas (palabras agrupadas por Y y ordenadas por X)."""
+        return "\n".join(" ".join(w["text"] for w in linea)
+                         for linea in _agrupar_lineas(self.extract_words()))
+
+    def close(self):
+        self._words = None
+        if self._page is not None:
+            self._page.close()
+            self._page = None
+
+    def _leer_palabras(self, x_tolerance: float, y_tolerance: float) -> list[dict]:
+        """Agrupa caracteres consecutivos en palabras con cajas estilo pdfplumber."""
+        if self._page is None:
+            self._page = self._doc[self._indice]
+        textpage = self._page.get_textpage()
+        words: list[dict] = []
+        actual = None
+        try:
+            for i in range(textpage.count_chars()):
+                c = chr(pypdfium2.raw.FPDFText_GetUnicode(textpage, i))
+                if c.isspace() or not c.isprintable():
+                    actual = None
+                    continue
+                x0, y0, x1, y1 = textpage.get_charbox(i, loose=True)
+                top, bottom = self.height - y1, self.height - y0
+                if (actual is not None
+                        and abs(top - actual["top"]) <= y_tolerance
+                        and actual["x0"] <= x0 <= actual["x1"] + x_tolerance):
+                    actual["text"] += c
+                    actual["x1"] = x1
+                    actual["bottom"] = max(actual["bottom"], bottom)
+                else:
+                    actual = {"text": c, "x0": x0, "x1": x1, "top": top, "bottom": bottom}
+                    words.append(actual)
+        finally:
+            textpage.close()
+        return words
+
+
+# ---------------------------------------------------------------------------
+# Pre-verificación de capa de texto
+# ---------------------------------------------------------------------------
+# Un balance escaneado no tiene capa de texto: la extracción completa abriría
+# todas las páginas para terminar con 0 cuentas. Antes de extraer se cuentan
+# los caracteres de unas pocas páginas con el API nativo de pdfium, que no
+# construye cajas de palabras ni analiza layout.
+MIN_CARACTERES_TEXTO = 20
+
+
+class PDFSinTextoError(ValueError):
+    """El PDF no tiene capa de texto (típicamente, un balance escaneado)."""
+
+
+@dataclass
+class DiagnosticoTexto:
+    tiene_texto: bool
+    n_paginas: int
+    caracteres: dict = field(default_factory=dict)   # {página (1-based): caracteres no blancos}
+    motivo: str = ""
+
+
+def _paginas_muestra(n_paginas: int) -> list[int]:
+    """Primera, central y última página (índices 0-based, sin repetir)."""
+    return sorted({0, n_paginas // 2, n_paginas - 1}) if n_paginas else []
+
+
+def diagnosticar_texto(pdf_source) -> DiagnosticoTexto:
+    """
+    Verifica rápidamente si el PDF tiene capa de texto extraíble contando
+    los caracteres no blancos de la primera, la central y la última página.
+    """
+    with _buffer_pdf(pdf_source) as buffer:
+        lector = _LectorMemoria(buffer)
+        try:
+            doc = pypdfium2.PdfDocument(lector)
+            try:
+                n_paginas = len(doc)
+                caracteres = {}
+                for i in _paginas_muestra(n_paginas):
+                    page = doc[i]
+                    textpage = page.get_textpage()
+                    try:
+                        texto = textpage.get_text_range() if textpage.count_chars() else ""
+                    finally:
+                        textpage.close()
+                        page.close()
+                    caracteres[i + 1] = sum(1 for c in texto if not c.isspace())
+            finally:
+                doc.close()
+        finally:
+            lector.close()
+
+    if n_paginas == 0:
+        motivo = "el PDF no tiene páginas"
+    elif sum(caracteres.values()) < MIN_CARACTERES_TEXTO:
+        motivo = ("el PDF no tiene capa de texto (probablemente es un escaneo); "
+                  "exporte el balance directamente desde el software contable")
+    else:
+        motivo = ""
+    return DiagnosticoTexto(not motivo, n_paginas, caracteres, motivo)
+
+
 # ---------------------------------------------------------------------------
 # Extracción de datos de empresa
 # ---------------------------------------------------------------------------
@@ -186,91 +1065,181 @@ def _extraer_datos_empresa(texto: str, empresa: dict):
 # ---------------------------------------------------------------------------
 # Extracción de cuentas
 # ---------------------------------------------------------------------------
-def _extraer_cuentas_pagina(page, cuentas: dict):
+def _filas_pagina(words: list[dict], layout: LayoutColumnas, n_pagina: int,
+                  informe: InformeExtraccion | None = None,
+                  pagina: dict | None = None) -> list[FilaBalance]:
     """
-    Extrae cuentas de una página usando posiciones de palabras (words).
+    Extrae las filas de cuentas de una página usando posiciones de palabras (words).
     Estrategia:
-      1) Detectar posiciones X de columnas numéricas desde encabezado.
+      1) Usar las posiciones X de columnas numéricas del layout del documento.
       2) Para cada fila con código de 6 dígitos, leer valores en columnas.
     """
-    words = page.extract_words(x_tolerance=3, y_tolerance=3)
+    with _medir(informe, "agrupar_y", pagina):
+        lineas = _agrupar_lineas(words)
+    if pagina is not None:
+        pagina["filas"] = len(lineas)
+
+    with _medir(informe, "asignar_filas", pagina):
+        return _asignar_filas(lineas, layout, n_pagina)
+
+
+# Dos palabras están en la misma línea si sus bordes superiores difieren en
+# menos que esta fracción de la altura típica (mediana) de las palabras.
+_FRACCION_ALTURA_LINEA = 0.5
+
+
+def _agrupar_lineas(words: list[dict]) -> list[list[dict]]:
+    """
+    Agrupa las palabras en líneas con un barrido vertical: se ordenan una vez
+    por top y una palabra abre línea nueva cuando su top se aleja de la
+    primera palabra de la línea actual más que la tolerancia, derivada de la
+    altura de fuente. Retorna las líneas de arriba abajo, cada una ordenada
+    por X.
+    """
     if not words:
-        return
+        return []
+    ordenadas = sorted(words, key=itemgetter("top"))
+    alturas = sorted(w["bottom"] - w["top"] for w in ordenadas)
+    tolerancia = max(1.0, alturas[len(alturas) // 2] * _FRACCION_ALTURA_LINEA)
 
-    # Agrupar palabras por línea (Y aproximado)
-    lineas_dict: dict[float, list] = {}
-    for w in words:
-        y_key = round(w["top"] / 3) * 3
-        lineas_dict.setdefault(y_key, []).append(w)
+    lineas: list[list[dict]] = []
+    actual = [ordenadas[0]]
+    limite = ordenadas[0]["top"] + tolerancia
+    for w in ordenadas[1:]:
+        if w["top"] > limite:
+            actual.sort(key=itemgetter("x0"))
+            lineas.append(actual)
+            actual = []
+            limite = w["top"] + tolerancia
+        actual.append(w)
+    actual.sort(key=itemgetter("x0"))
+    lineas.append(actual)
+    return lineas
 
-    # Ordenar líneas por Y
-    lineas_ordenadas = sorted(lineas_dict.items())
 
-    # Detectar columnas desde encabezados
-    cols = _detectar_columnas_x(words)
+def _asignar_filas(lineas: list[list[dict]], layout: LayoutColumnas,
+                   n_pagina: int) -> list[FilaBalance]:
+    """
+    Lee código, nombre y montos de cada línea que comienza con un código de
+    6 dígitos, y las filas de cierre SUMAS / RESULTADO / TOTALES.
+    Las líneas llegan ordenadas por X (ver _agrupar_lineas).
+    """
+    filas: list[FilaBalance] = []
+    for palabras_fila in lineas:
+        codigo, nombre, valores_x = _tokenizar_linea(palabras_fila)
 
-    # Columnas numéricas en orden esperado (fallback por posición relativa)
-    # Estimamos desde la página si no detectamos encabezados
-    if len(cols) < 4:
-        cols = _estimar_columnas_por_posicion(page, lineas_ordenadas)
-
-    for _, palabras_fila in lineas_ordenadas:
-        palabras_fila.sort(key=lambda w: w["x0"])
-        textos = [w["text"] for w in palabras_fila]
-
-        # Buscar código de 6 dígitos
-        codigo = None
-        codigo_idx = -1
-        for i, t in enumerate(textos):
-            if _CODIGO_PATTERN.match(t):
-                codigo = t
-                codigo_idx = i
-                break
+        if codigo is None:
+            total = _fila_total(palabras_fila, valores_x, layout, n_pagina)
+            if total is not None:
+                filas.append(total)
+            continue
 
-        if not codigo:
+        if not valores_x:
             continue
 
-        # Nombre de cuenta = palabras entre código y primer número
-        nombre_parts = []
-        num_idx = codigo_idx + 1
-        while num_idx < len(textos) and not re.match(r"^[\d\.]+$", textos[num_idx]):
-            nombre_parts.append(textos[num_idx])
-            num_idx += 1
-        nombre = " ".join(nombre_parts)
+        # Solo entregar si tiene saldo en alguna columna relevante
+        montos = _montos_por_columna(valores_x, layout)
+        if not _COLUMNAS_SALDO.isdisjoint(montos):
+            filas.append(FilaBalance(pagina=n_pagina, codigo=codigo, cuenta=nombre, montos=montos))
+    return filas
 
-        # Recoger valores numéricos con sus posiciones X
-        valores_x: list[tuple[float, int]] = []
-        for w in palabras_fila:
-            if re.match(r"^[\d\.]+$", w["text"]):
-                valores_x.append(((w["x0"] + w["x1"]) / 2, _fmt_numero(w["text"])))
 
-        if not valores_x:
+# Caracteres de un monto: dígitos con punto como separador de miles
+_CARACTERES_MONTO = frozenset("0123456789.")
+
+# Columnas con saldo: una fila con código se entrega solo si tiene alguna
+_COLUMNAS_SALDO = frozenset(("activos", "pasivos", "perdidas", "ganancias",
+                             "saldo_deudor", "saldo_acreedor"))
+
+
+def _tokenizar_linea(palabras_fila: list[dict]) -> tuple[str | None, str, list]:
+    """
+    Clasifica cada palabra de la línea una sola vez como código, parte del
+    nombre o monto. El código es el primer número de 6 dígitos; el nombre son
+    las palabras entre el código y el primer monto; todo otro número es un
+    monto, que se convierte a entero quitando los puntos de miles.
+    Una línea que comienza con una etiqueta de cierre (SUMAS, TOTALES...) no
+    tiene código: un monto de 6 dígitos sin puntos sigue siendo un monto.
+    Retorna (codigo, nombre, [(x_centro, monto), ...]).
+    """
+    codigo = None
+    buscar_codigo = palabras_fila[0]["text"].upper().rstrip(":") not in _ETIQUETAS_TOTALES
+    nombre_parts: list[str] = []
+    en_nombre = False
+    valores_x: list[tuple[float, int]] = []
+    for w in palabras_fila:
+        t = w["text"]
+        if _CARACTERES_MONTO.issuperset(t):
+            if buscar_codigo and codigo is None and len(t) == 6 and t.isdigit():
+                codigo = t
+                en_nombre = True
+                continue
+            en_nombre = False
+            digitos = t.replace(".", "")
+            valores_x.append(((w["x0"] + w["x1"]) / 2, int(digitos) if digitos else 0))
+        elif en_nombre:
+            nombre_parts.append(t)
+    return codigo, " ".join(nombre_parts), valores_x
+
+
+def _montos_por_columna(valores_x: list[tuple[float, int]], layout: LayoutColumnas) -> dict:
+    """Suma los montos positivos en la columna numérica más cercana a su X."""
+    montos: dict = {}
+    columnas = layout.asignar([x_val for x_val, _ in valores_x])
+    for col, (_, valor) in zip(columnas, valores_x):
+        if col and valor > 0:
+            montos[col] = montos.get(col, 0) + valor
+    return montos
+
+
+def _fila_total(palabras_fila: list[dict], valores_x: list[tuple[float, int]],
+                layout: LayoutColumnas, n_pagina: int) -> FilaBalance | None:
+    """Reconoce una fila de cierre (SUMAS, RESULTADO/UTILIDAD/PÉRDIDA, TOTALES) con montos."""
+    etiqueta = _ETIQUETAS_TOTALES.get(palabras_fila[0]["text"].upper().rstrip(":"))
+    if etiqueta is None:
+        return None
+    montos = _montos_por_columna(valores_x, layout)
+    if not montos:
+        return None
+    return FilaBalance(pagina=n_pagina, codigo="", cuenta=etiqueta, montos=montos, tipo="total")
+
+
+def verificar_totales(cuentas: TablaBalance) -> list[str]:
+    """
+    Verifica la cuadratura de las filas de cierre del balance:
+    SUMAS (débitos = créditos, saldo deudor = saldo acreedor) y
+    TOTALES (activos = pasivos, pérdidas = ganancias).
+    Retorna la lista de descuadres (vacía si cuadra o no hay totales).
+    """
+    descuadres = []
+    totales = getattr(cuentas, "totales", {})
+    pares = (
+        ("SUMAS", "debitos", "creditos"),
+        ("SUMAS", "saldo_deudor", "saldo_acreedor"),
+        ("TOTALES", "activos", "pasivos"),
+        ("TOTALES", "perdidas", "ganancias"),
+    )
+    for fila, col_a, col_b in pares:
+        if fila not in totales:
             continue
+        a, b = totales[fila].get(col_a, 0), totales[fila].get(col_b, 0)
+        if a != b:
+            descuadres.append(f"{fila}: {col_a} {a:,} ≠ {col_b} {b:,}".replace(",", "."))
+    return descuadres
 
-        # Asignar valores a columnas por proximidad
-        registro: dict = {"cuenta": nombre}
-        columnas_numericas = ["debitos", "creditos", "saldo_deudor", "saldo_acreedor",
-                              "activos", "pasivos", "perdidas", "ganancias"]
-
-        for x_val, valor in valores_x:
-            col = _asignar_columna(x_val, {k: cols[k] for k in columnas_numericas if k in cols})
-            if col and valor > 0:
-                registro[col] = registro.get(col, 0) + valor
-
-        # Solo agregar si tiene saldo en alguna columna relevante
-        cols_relevantes = {"activos", "pasivos", "perdidas", "ganancias",
-                           "saldo_deudor", "saldo_acreedor"}
-        if any(k in registro for k in cols_relevantes):
-            if codigo not in cuentas:
-                cuentas[codigo] = registro
-            else:
-                # Acumular si la cuenta aparece en múltiples páginas
-                for k, v in registro.items():
-                    if k != "cuenta" and isinstance(v, int):
-                        cuentas[codigo][k] = cuentas[codigo].get(k, 0) + v
+
+def _acumular_cuenta(cuentas: dict, codigo: str, registro: dict):
+    """Agrega el registro a cuentas, sumando montos si el código ya existe."""
+    if codigo not in cuentas:
+        cuentas[codigo] = registro
+    else:
+        # Acumular si la cuenta aparece en múltiples páginas
+        for k, v in registro.items():
+            if k != "cuenta" and isinstance(v, int):
+                cuentas[codigo][k] = cuentas[codigo].get(k, 0) + v
 
 
-def _estimar_columnas_por_posicion(page, lineas_ordenadas: list) -> dict:
+def _estimar_columnas_por_posicion(page) -> dict:
     """
     Estimación de posiciones de columnas cuando no se detectan encabezados.
     Usa el ancho de la página y posiciones típicas de un balance de 8 columnas.
@@ -289,6 +1258,190 @@ def _estimar_columnas_por_posicion(page, lineas_ordenadas: list) -> dict:
     }
 
 
+# ---------------------------------------------------------------------------
+# Caché persistente de extracción
+# ---------------------------------------------------------------------------
+# Cada entrada es un archivo
+# "<sha256 del PDF>-<motor>[-completo]-v<VERSION_EXTRACTOR>.json.z"
+# (-completo si se extrajo con paginas_tras_totales=True) con el par
+# (cuentas, empresa) serializado en forma compacta. El mtime del archivo se
+# actualiza en cada acierto y sirve como marca LRU: al superar
+# CACHE_MAX_BYTES se eliminan primero las entradas usadas hace más tiempo.
+CACHE_DIR = Path(os.environ.get("RLI_CACHE_DIR", Path.home() / ".cache" / "rli_app"))
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _ruta_cache(clave: str) -> Path:
+    return CACHE_DIR / "balances" / f"{clave}-v{VERSION_EXTRACTOR}.json.z"
+
+
+def _serializar(cuentas: dict, empresa: dict) -> bytes:
+    """
+    Forma compacta: una fila [codigo, nombre, *8 montos] por cuenta, con 0
+    para las columnas ausentes (los montos guardados son siempre > 0).
+    """
+    filas = [
+        [codigo, reg.get("cuenta", "")] + [reg.get(col, 0) for col in COLUMNAS_NUMERICAS]
+        for codigo, reg in cuentas.items()
+    ]
+    totales = getattr(cuentas, "totales", {})
+    texto = json.dumps({"empresa": empresa, "filas": filas, "totales": totales},
+                       ensure_ascii=False, separators=(",", ":"))
+    return zlib.compress(texto.encode("utf-8"))
+
+
+def _deserializar(datos: bytes) -> tuple[TablaBalance, dict]:
+    obj = json.loads(zlib.decompress(datos).decode("utf-8"))
+    cuentas = TablaBalance()
+    for codigo, nombre, *montos in obj["filas"]:
+        cuentas.acumular(codigo, nombre,
+                         {col: valor for col, valor in zip(COLUMNAS_NUMERICAS, montos) if valor})
+    cuentas.totales = obj.get("totales", {})
+    cuentas.indexar()
+    return cuentas, obj["empresa"]
+
+
+def leer_cache(clave: str) -> tuple[TablaBalance, dict] | None:
+    """Retorna (cuentas, empresa) desde la caché o None si no hay entrada válida."""
+    ruta = _ruta_cache(clave)
+    try:
+        datos = ruta.read_bytes()
+        resultado = _deserializar(datos)
+    except (OSError, ValueError, KeyError, zlib.error):
+        return None
+    try:
+        os.utime(ruta)  # marca de uso reciente para LRU
+    except OSError:
+        pass
+    return resultado
+
+
+def guardar_cache(clave: str, cuentas: dict, empresa: dict):
+    """Guarda el resultado en la caché y aplica el límite de tamaño (LRU)."""
+    ruta = _ruta_cache(clave)
+    try:
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        tmp = ruta.with_suffix(f".tmp{os.getpid()}")
+        tmp.write_bytes(_serializar(cuentas, empresa))
+        os.replace(tmp, ruta)
+        _podar_cache(ruta.parent)
+    except OSError:
+        # La caché es solo una optimización: un disco lleno o de solo
+        # lectura no debe impedir la extracción.
+        pass
+
+
+def _podar_cache(directorio: Path):
+    entradas = []
+    for ruta in directorio.glob("*.json.z"):
+        try:
+            info = ruta.stat()
+        except OSError:
+            continue
+        entradas.append((info.st_mtime, info.st_size, ruta))
+    total = sum(tam for _, tam, _ in entradas)
+    for _, tam, ruta in sorted(entradas, key=lambda e: e[0]):
+        if total <= CACHE_MAX_BYTES:
+            break
+        try:
+            ruta.unlink()
+            total -= tam
+        except OSError:
+            pass
+
+
+# ---------------------------------------------------------------------------
+# Plantillas de layout por software contable
+# ---------------------------------------------------------------------------
+# Los balances de un mismo software contable comparten geometría: mismo
+# tamaño de página, mismo productor y encabezados en las mismas posiciones.
+# La huella de un layout resume esos tres datos; cada huella cuyo balance
+# cuadró (verificar_totales sin descuadres) se registra en
+# "plantillas/<huella>.json" con sus columnas. Un documento con huella
+# registrada no pasa por _detectar_columnas_x ni por
+# _estimar_columnas_por_posicion. Una plantilla cuyo balance deja de cuadrar
+# se elimina y el layout vuelve a detectarse.
+def _ruta_plantilla(huella: str) -> Path:
+    return CACHE_DIR / "plantillas" / f"{huella}-v{VERSION_EXTRACTOR}.json"
+
+
+def _huella_layout(productor: str, geometria: tuple[int, int],
+                   words: list[dict]) -> str | None:
+    """
+    Huella del layout: productor, geometría de página y posición (redondeada
+    al punto) de las palabras de encabezado sobre la primera fila con
+    código. None si la página no tiene encabezado de tabla.
+    """
+    primera_fila = min((w["top"] for w in words if _CODIGO_PATTERN.match(w["text"])),
+                       default=None)
+    if primera_fila is None:
+        return None
+    encabezado = sorted(
+        (round(w["top"]), round(w["x0"]), w["text"].upper())
+        for w in words
+        if w["top"] < primera_fila and w["text"].upper() in _PALABRAS_ENCABEZADO
+    )
+    if len(encabezado) < 4:
+        return None
+    firma = json.dumps([productor, list(geometria), encabezado], ensure_ascii=False)
+    return hashlib.sha256(firma.encode("utf-8")).hexdigest()[:24]
+
+
+def leer_plantilla(huella: str) -> dict | None:
+    """Retorna {"productor", "geometria", "cols"} o None si no está registrada."""
+    try:
+        plantilla = json.loads(_ruta_plantilla(huella).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(plantilla, dict) or "cols" not in plantilla:
+        return None
+    return plantilla
+
+
+def guardar_plantilla(layout: LayoutColumnas, productor: str = ""):
+    """Registra las columnas de un layout verificado bajo su huella."""
+    ruta = _ruta_plantilla(layout.huella)
+    plantilla = {
+        "productor": productor,
+        "geometria": list(layout.geometria),
+        "cols": layout.cols,
+    }
+    try:
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        tmp = ruta.with_suffix(f".tmp{os.getpid()}")
+        tmp.write_text(json.dumps(plantilla, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, ruta)
+    except OSError:
+        pass
+
+
+def borrar_plantilla(huella: str):
+    try:
+        _ruta_plantilla(huella).unlink()
+    except OSError:
+        pass
+
+
+def _confirmar_plantilla(layout: "LayoutColumnas | None", totales: dict, productor: str):
+    """
+    Con los totales de todo el documento: registra el layout si el balance
+    cuadra y descarta la plantilla usada si no cuadra. Sin fila TOTALES
+    (documento incompleto) no hace nada.
+    """
+    if layout is None or layout.huella is None:
+        return
+    if "TOTALES" not in totales:
+        return
+    tabla = TablaBalance()
+    tabla.totales = totales
+    if verificar_totales(tabla) or "SUMAS" not in totales:
+        if layout.desde_plantilla:
+            borrar_plantilla(layout.huella)
+        return
+    if not layout.desde_plantilla:
+        guardar_plantilla(layout, productor)
+
+
 # ---------------------------------------------------------------------------
 # Función de consulta
 # ---------------------------------------------------------------------------
@@ -299,12 +1452,16 @@ def get_valor(cuentas: dict, codigo: str, columna: str = None) -> int:
     saldo_acreedor, saldo_deudor.
     Retorna 0 si no existe.
     """
+    if isinstance(cuentas, TablaBalance):
+        if columna:
+            return cuentas.valor(codigo, columna)
+        return cuentas.principal(codigo)[0]
     if codigo not in cuentas:
         return 0
     reg = cuentas[codigo]
     if columna:
         return reg.get(columna, 0)
-    for col in ("ganancias", "perdidas", "activos", "pasivos", "saldo_acreedor", "saldo_deudor"):
+    for col in COLUMNAS_PRIORIDAD:
         if col in reg and reg[col] > 0:
             return reg[col]
     return 0
@@ -312,8 +1469,182 @@ def get_valor(cuentas: dict, codigo: str, columna: str = None) -> int:
 
 def get_nombre(cuentas: dict, codigo: str) -> str:
     """Retorna el nombre de la cuenta o string vacío."""
+    if isinstance(cuentas, TablaBalance):
+        return cuentas.nombre(codigo)
     return cuentas.get(codigo, {}).get("cuenta", "")
 
 
 def existe_cuenta(cuentas: dict, codigo: str) -> bool:
     return codigo in cuentas
+
+
+def leer_cuenta(cuentas: dict, codigo: str, columna: str) -> tuple[bool, str, int]:
+    """
+    existe_cuenta, get_nombre y get_valor con columna en una sola consulta.
+    Retorna (existe, nombre, monto).
+    """
+    if isinstance(cuentas, TablaBalance):
+        return cuentas.leer(codigo, columna)
+    reg = cuentas.get(codigo)
+    if reg is None:
+        return False, "", 0
+    return True, reg.get("cuenta", ""), reg.get(columna, 0)
+
+
+# ---------------------------------------------------------------------------
+# Extracción por lotes (línea de comandos)
+# ---------------------------------------------------------------------------
+# python -m extractor batch <directorio> [--salida archivo.jsonl] [--procesos N]
+#
+# Cada PDF del directorio se extrae en un pool de procesos y el resultado se
+# agrega a un archivo JSON Lines: un registro {"tipo": "cuenta", ...} por
+# cuenta y, al final del bloque de cada archivo, un {"tipo": "resumen", ...}.
+# El bloque de un archivo se escribe de una sola vez, y un archivo cuyo
+# sha256 ya tiene resumen en la salida se omite, de modo que un lote
+# interrumpido se retoma con el mismo comando (--reintentar-errores vuelve
+# a extraer los archivos cuyo resumen registra un error).
+def _sha256_archivo(ruta) -> str:
+    if os.path.getsize(ruta) == 0:
+        return hashlib.sha256(b"").hexdigest()   # mmap no acepta archivos vacíos
+    with _buffer_pdf(ruta) as buffer:
+        return hashlib.sha256(buffer).hexdigest()
+
+
+def _procesados(salida: Path, reintentar_errores: bool = False) -> set[str]:
+    """
+    Hashes de los archivos con resumen en la salida (solo los sin error si
+    reintentar_errores). Una última línea incompleta (lote interrumpido a
+    mitad de escritura) se descarta.
+    """
+    if not salida.exists():
+        return set()
+    with open(salida, "rb+") as f:
+        contenido = f.read()
+        fin = contenido.rfind(b"\n") + 1
+        if fin < len(contenido):
+            f.truncate(fin)
+    hechos = set()
+    for linea in contenido[:fin].splitlines():
+        try:
+            registro = json.loads(linea)
+        except ValueError:
+            continue
+        if registro.get("tipo") == "resumen" and not (reintentar_errores and registro.get("error")):
+            hechos.add(registro["sha256"])
+    return hechos
+
+
+def _extraer_archivo(ruta: str, sha256: str, motor: str, usar_cache: bool) -> list[dict]:
+    """Worker del lote: registros de cuentas del archivo seguidos de su resumen."""
+    informe = InformeExtraccion()
+    base = {"archivo": ruta, "sha256": sha256}
+    t0 = time.perf_counter()
+    try:
+        cuentas, empresa = extraer_balance(ruta, usar_cache=usar_cache, motor=motor,
+                                           informe=informe, bajo_consumo=True,
+                                           usar_plantillas=True)
+    except Exception as e:  # el lote sigue con los demás archivos
+        return [{"tipo": "resumen", **base, "error": f"{type(e).__name__}: {e}",
+                 "segundos": round(time.perf_counter() - t0, 3)}]
+    registros = [{"tipo": "cuenta", **base, "codigo": codigo, **reg}
+                 for codigo, reg in cuentas.items()]
+    registros.append({
+        "tipo": "resumen", **base, "error": None,
+        "cuentas": len(cuentas),
+        "empresa": empresa,
+        "totales": cuentas.totales,
+        "descuadres": verificar_totales(cuentas),
+        "motor": informe.motor,
+        "paginas": informe.n_paginas,
+        "segundos": round(time.perf_counter() - t0, 3),
+    })
+    return registros
+
+
+def extraer_lote(directorio, salida, procesos: int | None = None,
+                 motor: str = "auto", usar_cache: bool = False,
+                 recursivo: bool = False, reintentar_errores: bool = False) -> dict:
+    """
+    Extrae todos los PDF de directorio y agrega los registros a salida
+    (JSON Lines). Retorna {"procesados", "omitidos", "errores"}.
+    """
+    if motor not in MOTORES:
+        raise ValueError(f"Motor de extracción desconocido: {motor!r}")
+    directorio, salida = Path(directorio), Path(salida)
+    patron = "**/*" if recursivo else "*"
+    rutas = sorted(r for r in directorio.glob(patron)
+                   if r.is_file() and r.suffix.lower() == ".pdf")
+    hechos = _procesados(salida, reintentar_errores)
+    pendientes = []
+    ilegibles = []
+    for ruta in rutas:
+        try:
+            sha256 = _sha256_archivo(ruta)
+        except (OSError, ValueError) as e:
+            # Sin hash no hay reanudación posible: se registra el error y el
+            # archivo se vuelve a intentar en el próximo lote.
+            ilegibles.append([{"tipo": "resumen", "archivo": str(ruta), "sha256": None,
+                               "error": f"{type(e).__name__}: {e}", "segundos": 0.0}])
+            continue
+        if sha256 not in hechos:
+            hechos.add(sha256)   # un PDF duplicado en el directorio se extrae una vez
+            pendientes.append((str(ruta), sha256))
+
+    total = len(pendientes) + len(ilegibles)
+    resultado = {"procesados": 0, "omitidos": len(rutas) - total, "errores": 0}
+    if not total:
+        return resultado
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    with open(salida, "a", encoding="utf-8") as f:
+        n = 0
+        for n, registros in enumerate(ilegibles, 1):
+            _escribir_registros(f, registros, resultado, n, total)
+        if pendientes:
+            with ProcessPoolExecutor(max_workers=procesos) as pool:
+                futuros = [pool.submit(_extraer_archivo, ruta, sha256, motor, usar_cache)
+                           for ruta, sha256 in pendientes]
+                for n, futuro in enumerate(as_completed(futuros), n + 1):
+                    _escribir_registros(f, futuro.result(), resultado, n, total)
+    return resultado
+
+
+def _escribir_registros(f, registros: list[dict], resultado: dict, n: int, total: int):
+    """Escribe el bloque de un archivo de una sola vez y actualiza los contadores."""
+    resumen = registros[-1]
+    f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in registros))
+    f.flush()
+    if resumen["error"]:
+        resultado["errores"] += 1
+        estado = resumen["error"]
+    else:
+        resultado["procesados"] += 1
+        estado = f"{resumen['cuentas']} cuentas en {resumen['segundos']} s"
+    print(f"[{n}/{total}] {resumen['archivo']}: {estado}", file=sys.stderr)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m extractor",
+                                     description="Extracción de balances de 8 columnas.")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    batch = comandos.add_parser("batch", help="extrae todos los PDF de un directorio a JSON Lines")
+    batch.add_argument("directorio")
+    batch.add_argument("--salida", help="archivo JSON Lines (por defecto <directorio>/extraccion.jsonl)")
+    batch.add_argument("--procesos", type=int, default=None,
+                       help="procesos del pool (por defecto, uno por CPU)")
+    batch.add_argument("--motor", default="auto", choices=MOTORES)
+    batch.add_argument("--cache", action="store_true", help="usar la caché persistente de extracción")
+    batch.add_argument("--recursivo", action="store_true", help="incluir subdirectorios")
+    batch.add_argument("--reintentar-errores", action="store_true",
+                       help="volver a extraer los archivos cuyo resumen registra un error")
+    args = parser.parse_args(argv)
+
+    salida = args.salida or Path(args.directorio) / "extraccion.jsonl"
+    resultado = extraer_lote(args.directorio, salida, args.procesos, args.motor,
+                             args.cache, args.recursivo, args.reintentar_errores)
+    print(f"{resultado['procesados']} procesados, {resultado['omitidos']} omitidos, "
+          f"{resultado['errores']} con error → {salida}", file=sys.stderr)
+    return 1 if resultado["errores"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,13 @@ Lógica tributaria completa para el Régimen 14 D N°3 (ProPyme Transparente).
 Calcula la Renta Líquida Imponible (RLI) e Impuesto de Primera Categoría (12,5%).
 """
 
+import hashlib
+import json
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+from operator import add, sub
 from dataclasses import dataclass, field
 from typing import Optional
 
@@ -12,16 +19,64 @@ from typing import Optional
 # ---------------------------------------------------------------------------
 # Constantes
 # ---------------------------------------------------------------------------
-TASA_IDPC = 0.125  # 12.5%
+TASA_IDPC = 0.125  # 12.5% (para mostrar; el cálculo usa TASA_IDPC_EXACTA)
 UF_DEFECTO = 5000  # UF para deducción incentivo ahorro (editable)
+MEMO_LINEAS_MAX = 64  # entradas (balance, extras) recordadas por construir_lineas*
+
+
+# ---------------------------------------------------------------------------
+# Aritmética entera
+# ---------------------------------------------------------------------------
+# Las tasas se expresan como razones exactas de enteros y los montos se
+# calculan sin pasar por float, con un modo de redondeo explícito. El cálculo
+# escalar y calcular_lote usan las mismas funciones, por lo que sus
+# resultados son idénticos para cualquier monto.
+TRUNCAR = "truncar"        # hacia cero, como int() sobre el producto en float
+REDONDEO_SII = "sii"       # al peso más cercano; las mitades se alejan de cero
+REDONDEOS = (TRUNCAR, REDONDEO_SII)
+
+
+@dataclass(frozen=True, slots=True)
+class Tasa:
+    """Tasa num/den aplicada a montos enteros."""
+    num: int
+    den: int
+
+    def aplicar(self, monto: int, redondeo: str = TRUNCAR) -> int:
+        """monto × num / den en enteros, redondeado según el modo indicado."""
+        if redondeo == TRUNCAR:
+            q = abs(monto) * self.num // self.den
+        elif redondeo == REDONDEO_SII:
+            q = (2 * abs(monto) * self.num + self.den) // (2 * self.den)
+        else:
+            raise ValueError(f"Modo de redondeo desconocido: {redondeo!r}")
+        return q if monto >= 0 else -q
+
+    def aplicar_columna(self, montos, redondeo: str = TRUNCAR) -> list[int]:
+        """aplicar() sobre una columna de montos, sin llamada por elemento."""
+        num, den = self.num, self.den
+        if redondeo == TRUNCAR:
+            return [m * num // den if m >= 0 else -(-m * num // den) for m in montos]
+        if redondeo == REDONDEO_SII:
+            return [(2 * m * num + den) // (2 * den) if m >= 0
+                    else -((-2 * m * num + den) // (2 * den)) for m in montos]
+        raise ValueError(f"Modo de redondeo desconocido: {redondeo!r}")
+
+    def __float__(self) -> float:
+        return self.num / self.den
+
+
+TASA_IDPC_EXACTA = Tasa(1, 8)          # 12,5%
+TASA_INCENTIVO_RLI = Tasa(1, 2)        # 50% de la RLI invertida (Art. 14 E LIR)
+REDONDEO_IDPC = TRUNCAR                # el cálculo histórico truncaba con int()
 
 
 # ---------------------------------------------------------------------------
 # Estructuras de datos
 # ---------------------------------------------------------------------------
-@dataclass
+@dataclass(frozen=True, slots=True)
 class CuentaLinea:
-    """Representa una línea de cuenta en el cálculo."""
+    """Representa una línea de cuenta en el cálculo (inmutable)."""
     codigo: str
     nombre: str
     monto: int
@@ -31,9 +86,9 @@ class CuentaLinea:
     existe_en_balance: bool = True
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ResultadoRLI:
-    """Resultado completo del cálculo RLI."""
+    """Resultado completo del cálculo RLI (inmutable)."""
     # Totales intermedios
     total_ingresos: int = 0
     total_egresos: int = 0
@@ -106,119 +161,186 @@ CODIGOS_REMUNERACIONES = {"410101", "410102", "410110", "410111"}
 
 
 # ---------------------------------------------------------------------------
-# Funciones principales
+# Plan de cuentas compilado
 # ---------------------------------------------------------------------------
-def construir_lineas_ingresos(cuentas_balance: dict, extras: list[dict] = None) -> list[CuentaLinea]:
-    """Construye lista de líneas para la sección I. INGRESOS."""
-    from extractor import get_valor, get_nombre, existe_cuenta
+# Las listas CUENTAS_*_DEFAULT se compilan una vez, al importar el módulo, en
+# una tupla de reglas con la sección, el signo, la columna del balance de la
+# que se lee el monto y el código F22. construir_lineas recorre ese plan una
+# vez, sección por sección, con una sola consulta al balance por línea.
+SECCIONES = ("ingresos", "egresos", "gastos_rechazados")
 
-    lineas = []
+# Columna del balance de la que se leen las cuentas extra de cada sección
+COLUMNA_EXTRAS = {"ingresos": "ganancias", "egresos": "perdidas", "gastos_rechazados": "perdidas"}
+
+
+@dataclass(frozen=True, slots=True)
+class ReglaCuenta:
+    """Una cuenta por defecto del régimen, lista para leerse del balance."""
+    seccion: str
+    codigo: str
+    nombre: str
+    signo: str
+    f22: str
+    columna: Optional[str]    # None en cuentas manuales fijas (monto 0, editable)
+
+
+def _compilar_plan() -> tuple[ReglaCuenta, ...]:
+    plan = []
     for d in CUENTAS_INGRESOS_DEFAULT:
-        if d.get("manual_fijo"):
-            # Cuenta manual fija — no se extrae del balance, monto editable
-            lineas.append(CuentaLinea(
-                codigo=d["codigo"],
-                nombre=d["nombre"],
-                monto=0,
-                signo=d["signo"],
-                f22=d["f22"],
-                es_manual=True,
-                existe_en_balance=True,  # no mostrar warning
-            ))
-        else:
-            monto = get_valor(cuentas_balance, d["codigo"], "ganancias")
-            lineas.append(CuentaLinea(
-                codigo=d["codigo"],
-                nombre=get_nombre(cuentas_balance, d["codigo"]) or d["nombre"],
-                monto=monto,
-                signo=d["signo"],
-                f22=d["f22"],
-                existe_en_balance=existe_cuenta(cuentas_balance, d["codigo"]),
-            ))
-    for e in (extras or []):
-        monto = get_valor(cuentas_balance, e["codigo"], "ganancias") if not e.get("es_manual") else e["monto"]
-        lineas.append(CuentaLinea(
-            codigo=e["codigo"],
-            nombre=get_nombre(cuentas_balance, e["codigo"]) or e.get("nombre", ""),
-            monto=monto,
-            signo=e.get("signo", "+"),
-            f22=e.get("f22", ""),
-            es_manual=e.get("es_manual", False),
-            existe_en_balance=existe_cuenta(cuentas_balance, e["codigo"]),
-        ))
-    return lineas
+        plan.append(ReglaCuenta("ingresos", d["codigo"], d["nombre"], d["signo"], d["f22"],
+                                None if d.get("manual_fijo") else "ganancias"))
+    for d in CUENTAS_EGRESOS_DEFAULT:
+        # Determinar columna del balance según la cuenta
+        col = d.get("col", "activos" if d["codigo"] == "101090" else "perdidas")
+        plan.append(ReglaCuenta("egresos", d["codigo"], d["nombre"], d["signo"], d["f22"],
+                                None if d.get("manual_fijo") else col))
+    for d in CUENTAS_GASTOS_RECHAZADOS_DEFAULT:
+        plan.append(ReglaCuenta("gastos_rechazados", d["codigo"], d["nombre"], d["signo"],
+                                d["f22"], "perdidas"))
+    return tuple(plan)
 
 
-def construir_lineas_egresos(cuentas_balance: dict, extras: list[dict] = None) -> list[CuentaLinea]:
-    """Construye lista de líneas para la sección II. EGRESOS."""
-    from extractor import get_valor, get_nombre, existe_cuenta
+PLAN_CUENTAS = _compilar_plan()
+PLAN_POR_SECCION = {s: tuple(r for r in PLAN_CUENTAS if r.seccion == s) for s in SECCIONES}
+
+
+# ---------------------------------------------------------------------------
+# Memo de líneas construidas
+# ---------------------------------------------------------------------------
+# Cada rerun de la app (y generar_pdf) vuelve a pedir las mismas secciones
+# con el mismo balance y los mismos extras. Cada sección se recuerda por
+# (huella del contenido del balance, sección, copia inmutable de sus extras)
+# en un LRU de MEMO_LINEAS_MAX entradas: cambia la clave, y por lo tanto se
+# reconstruye, solo si cambia el balance o algún extra de esa sección.
+# construir_lineas y construir_lineas_* usan la misma clave, así que se
+# reaprovechan entre sí. Las líneas se guardan en tuplas y cada llamada
+# entrega listas nuevas.
+_MEMO_LINEAS: OrderedDict = OrderedDict()
+_MEMO_LOCK = threading.Lock()
+
+
+def huella_balance(cuentas_balance: dict) -> str:
+    """SHA-256 del contenido del balance (códigos, nombres y montos)."""
+    from extractor import TablaBalance
+    if isinstance(cuentas_balance, TablaBalance):
+        return cuentas_balance.huella()
+    texto = json.dumps(cuentas_balance, sort_keys=True, ensure_ascii=False, default=dict)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def _clave_memo(huella: str, seccion: str, extras: list[dict]) -> Optional[tuple]:
+    """Clave del memo; None si los extras tienen valores no hashables (sin memo)."""
+    clave = (huella, seccion, tuple(tuple(sorted(e.items())) for e in (extras or ())))
+    try:
+        hash(clave)
+    except TypeError:
+        return None
+    return clave
+
+
+def _memo_lineas(clave: Optional[tuple], construir):
+    if clave is None:
+        return construir()
+    with _MEMO_LOCK:
+        valor = _MEMO_LINEAS.get(clave)
+        if valor is not None:
+            _MEMO_LINEAS.move_to_end(clave)
+            return valor
+    valor = construir()
+    with _MEMO_LOCK:
+        _MEMO_LINEAS[clave] = valor
+        while len(_MEMO_LINEAS) > MEMO_LINEAS_MAX:
+            _MEMO_LINEAS.popitem(last=False)
+    return valor
+
 
+# ---------------------------------------------------------------------------
+# Funciones principales
+# ---------------------------------------------------------------------------
+def construir_lineas(cuentas_balance: dict,
+                     extras_ingresos: list[dict] = None,
+                     extras_egresos: list[dict] = None,
+                     extras_gastos_rechazados: list[dict] = None) -> dict[str, list[CuentaLinea]]:
+    """
+    Construye las tres secciones, con la huella del balance calculada una vez.
+    Retorna {"ingresos": [...], "egresos": [...], "gastos_rechazados": [...]}.
+    """
+    extras = {
+        "ingresos": extras_ingresos,
+        "egresos": extras_egresos,
+        "gastos_rechazados": extras_gastos_rechazados,
+    }
+    huella = huella_balance(cuentas_balance)
+    return {s: _construir_seccion(cuentas_balance, s, extras[s], huella) for s in SECCIONES}
+
+
+def _construir_seccion(cuentas_balance: dict, seccion: str, extras: list[dict],
+                       huella: Optional[str] = None) -> list[CuentaLinea]:
+    def construir():
+        lineas = [_linea_regla(cuentas_balance, regla) for regla in PLAN_POR_SECCION[seccion]]
+        lineas.extend(_lineas_extras(cuentas_balance, seccion, extras))
+        return tuple(lineas)
+
+    if huella is None:
+        huella = huella_balance(cuentas_balance)
+    return list(_memo_lineas(_clave_memo(huella, seccion, extras), construir))
+
+
+def _linea_regla(cuentas_balance: dict, regla: ReglaCuenta) -> CuentaLinea:
+    from extractor import leer_cuenta
+    if regla.columna is None:
+        # Cuenta manual fija — no se extrae del balance, monto editable
+        return CuentaLinea(
+            codigo=regla.codigo,
+            nombre=regla.nombre,
+            monto=0,
+            signo=regla.signo,
+            f22=regla.f22,
+            es_manual=True,
+            existe_en_balance=True,  # no mostrar warning
+        )
+    existe, nombre, monto = leer_cuenta(cuentas_balance, regla.codigo, regla.columna)
+    return CuentaLinea(
+        codigo=regla.codigo,
+        nombre=nombre or regla.nombre,
+        monto=monto,
+        signo=regla.signo,
+        f22=regla.f22,
+        existe_en_balance=existe,
+    )
+
+
+def _lineas_extras(cuentas_balance: dict, seccion: str, extras: list[dict]) -> list[CuentaLinea]:
+    from extractor import leer_cuenta
+    columna = COLUMNA_EXTRAS[seccion]
     lineas = []
-    for d in CUENTAS_EGRESOS_DEFAULT:
-        if d.get("manual_fijo"):
-            # Cuenta manual fija — no se extrae del balance, monto editable
-            lineas.append(CuentaLinea(
-                codigo=d["codigo"],
-                nombre=d["nombre"],
-                monto=0,
-                signo=d["signo"],
-                f22=d["f22"],
-                es_manual=True,
-                existe_en_balance=True,
-            ))
-        else:
-            # Determinar columna del balance según la cuenta
-            col = d.get("col", "activos" if d["codigo"] == "101090" else "perdidas")
-            monto = get_valor(cuentas_balance, d["codigo"], col)
-            lineas.append(CuentaLinea(
-                codigo=d["codigo"],
-                nombre=get_nombre(cuentas_balance, d["codigo"]) or d["nombre"],
-                monto=monto,
-                signo=d["signo"],
-                f22=d["f22"],
-                existe_en_balance=existe_cuenta(cuentas_balance, d["codigo"]),
-            ))
     for e in (extras or []):
-        monto = get_valor(cuentas_balance, e["codigo"], "perdidas") if not e.get("es_manual") else e["monto"]
+        existe, nombre, monto = leer_cuenta(cuentas_balance, e["codigo"], columna)
         lineas.append(CuentaLinea(
             codigo=e["codigo"],
-            nombre=get_nombre(cuentas_balance, e["codigo"]) or e.get("nombre", ""),
-            monto=monto,
+            nombre=nombre or e.get("nombre", ""),
+            monto=e["monto"] if e.get("es_manual") else monto,
             signo=e.get("signo", "+"),
             f22=e.get("f22", ""),
             es_manual=e.get("es_manual", False),
-            existe_en_balance=existe_cuenta(cuentas_balance, e["codigo"]),
+            existe_en_balance=existe,
         ))
     return lineas
 
 
+def construir_lineas_ingresos(cuentas_balance: dict, extras: list[dict] = None) -> list[CuentaLinea]:
+    """Construye lista de líneas para la sección I. INGRESOS."""
+    return _construir_seccion(cuentas_balance, "ingresos", extras)
+
+
+def construir_lineas_egresos(cuentas_balance: dict, extras: list[dict] = None) -> list[CuentaLinea]:
+    """Construye lista de líneas para la sección II. EGRESOS."""
+    return _construir_seccion(cuentas_balance, "egresos", extras)
+
+
 def construir_lineas_gastos_rechazados(cuentas_balance: dict, extras: list[dict] = None) -> list[CuentaLinea]:
     """Construye lista de líneas para la sección III. GASTOS RECHAZADOS."""
-    from extractor import get_valor, get_nombre, existe_cuenta
-
-    lineas = []
-    for d in CUENTAS_GASTOS_RECHAZADOS_DEFAULT:
-        monto = get_valor(cuentas_balance, d["codigo"], "perdidas")
-        lineas.append(CuentaLinea(
-            codigo=d["codigo"],
-            nombre=get_nombre(cuentas_balance, d["codigo"]) or d["nombre"],
-            monto=monto,
-            signo=d["signo"],
-            f22=d["f22"],
-            existe_en_balance=existe_cuenta(cuentas_balance, d["codigo"]),
-        ))
-    for e in (extras or []):
-        monto = get_valor(cuentas_balance, e["codigo"], "perdidas") if not e.get("es_manual") else e["monto"]
-        lineas.append(CuentaLinea(
-            codigo=e["codigo"],
-            nombre=get_nombre(cuentas_balance, e["codigo"]) or e.get("nombre", ""),
-            monto=monto,
-            signo=e.get("signo", "+"),
-            f22=e.get("f22", ""),
-            es_manual=e.get("es_manual", False),
-            existe_en_balance=existe_cuenta(cuentas_balance, e["codigo"]),
-        ))
-    return lineas
+    return _construir_seccion(cuentas_balance, "gastos_rechazados", extras)
 
 
 def calcular_total_remuneraciones(lineas_egresos: list[CuentaLinea]) -> int:
@@ -253,16 +375,17 @@ def calcular_sin_incentivo(
         IDPC = Base Imponible * 12,5%
         Saldo = IDPC - PPM
     """
-    r = ResultadoRLI()
-    r.total_ingresos = total_ingresos
-    r.total_egresos = total_egresos
-    r.total_gastos_rechazados = total_gastos_rechazados
-    r.ppm = ppm
-
-    r.base_imponible = total_ingresos - total_egresos + total_gastos_rechazados
-    r.idpc_sin_incentivo = int(r.base_imponible * TASA_IDPC)
-    r.saldo_sin_incentivo = r.idpc_sin_incentivo - ppm
-    return r
+    base_imponible = total_ingresos - total_egresos + total_gastos_rechazados
+    idpc = TASA_IDPC_EXACTA.aplicar(base_imponible, REDONDEO_IDPC)
+    return ResultadoRLI(
+        total_ingresos=total_ingresos,
+        total_egresos=total_egresos,
+        total_gastos_rechazados=total_gastos_rechazados,
+        base_imponible=base_imponible,
+        idpc_sin_incentivo=idpc,
+        ppm=ppm,
+        saldo_sin_incentivo=idpc - ppm,
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -285,28 +408,160 @@ def calcular_con_incentivo(
     Paso 4: IDPC = Deducción * 12,5%
              Saldo = IDPC - PPM
     """
-    r = ResultadoRLI()
-    r.total_ingresos = total_ingresos
-    r.total_egresos = total_egresos
-    r.total_gastos_rechazados = total_gastos_rechazados
-    r.ppm = ppm
-    r.retiros_ejercicio = retiros_ejercicio
-    r.multas_intereses_hist = multas_hist
-    r.idpc_hist = idpc_hist
-
-    r.sub_total_base = total_ingresos - total_egresos + total_gastos_rechazados
-    r.rli_invertida = r.sub_total_base - retiros_ejercicio - multas_hist - idpc_hist
-
-    r.porcentaje_rli = int(r.rli_invertida * 0.50)
-    r.uf_limite = uf_valor_pesos
-
-    r.deduccion_incentivo = min(r.porcentaje_rli, uf_valor_pesos)
-    if r.deduccion_incentivo < 0:
-        r.deduccion_incentivo = 0
-
-    r.idpc_con_incentivo = int(r.deduccion_incentivo * TASA_IDPC)
-    r.saldo_con_incentivo = r.idpc_con_incentivo - ppm
-    return r
+    sub_total_base = total_ingresos - total_egresos + total_gastos_rechazados
+    rli_invertida = sub_total_base - retiros_ejercicio - multas_hist - idpc_hist
+
+    porcentaje_rli = TASA_INCENTIVO_RLI.aplicar(rli_invertida, REDONDEO_IDPC)
+
+    deduccion = min(porcentaje_rli, uf_valor_pesos)
+    if deduccion < 0:
+        deduccion = 0
+
+    idpc = TASA_IDPC_EXACTA.aplicar(deduccion, REDONDEO_IDPC)
+    return ResultadoRLI(
+        total_ingresos=total_ingresos,
+        total_egresos=total_egresos,
+        total_gastos_rechazados=total_gastos_rechazados,
+        ppm=ppm,
+        sub_total_base=sub_total_base,
+        retiros_ejercicio=retiros_ejercicio,
+        multas_intereses_hist=multas_hist,
+        idpc_hist=idpc_hist,
+        rli_invertida=rli_invertida,
+        deduccion_incentivo=deduccion,
+        porcentaje_rli=porcentaje_rli,
+        uf_limite=uf_valor_pesos,
+        idpc_con_incentivo=idpc,
+        saldo_con_incentivo=idpc - ppm,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Cálculo por lotes (cartera de contribuyentes)
+# ---------------------------------------------------------------------------
+# calcular_lote aplica las fórmulas de calcular_sin_incentivo y
+# calcular_con_incentivo a columnas completas (una posición por
+# contribuyente) con map/zip y Tasa.aplicar_columna, sin crear un
+# ResultadoRLI por contribuyente. Cada columna de salida es un array("q");
+# lote.sin_incentivo(i) y lote.con_incentivo(i) entregan el ResultadoRLI
+# idéntico al del cálculo escalar.
+@dataclass(frozen=True, slots=True)
+class LoteRLI:
+    """Columnas de entrada y de resultado del cálculo RLI de una cartera."""
+    total_ingresos: array
+    total_egresos: array
+    total_gastos_rechazados: array
+    ppm: array
+    retiros_ejercicio: array
+    multas_intereses_hist: array
+    idpc_hist: array
+    uf_limite: array
+    # Sin incentivo al ahorro
+    base_imponible: array
+    idpc_sin_incentivo: array
+    saldo_sin_incentivo: array
+    # Con incentivo al ahorro (sub_total_base = base_imponible)
+    rli_invertida: array
+    porcentaje_rli: array
+    deduccion_incentivo: array
+    idpc_con_incentivo: array
+    saldo_con_incentivo: array
+
+    def __len__(self) -> int:
+        return len(self.base_imponible)
+
+    def sin_incentivo(self, i: int) -> ResultadoRLI:
+        """ResultadoRLI del contribuyente i, igual a calcular_sin_incentivo."""
+        return ResultadoRLI(
+            total_ingresos=self.total_ingresos[i],
+            total_egresos=self.total_egresos[i],
+            total_gastos_rechazados=self.total_gastos_rechazados[i],
+            base_imponible=self.base_imponible[i],
+            idpc_sin_incentivo=self.idpc_sin_incentivo[i],
+            ppm=self.ppm[i],
+            saldo_sin_incentivo=self.saldo_sin_incentivo[i],
+        )
+
+    def con_incentivo(self, i: int) -> ResultadoRLI:
+        """ResultadoRLI del contribuyente i, igual a calcular_con_incentivo."""
+        return ResultadoRLI(
+            total_ingresos=self.total_ingresos[i],
+            total_egresos=self.total_egresos[i],
+            total_gastos_rechazados=self.total_gastos_rechazados[i],
+            ppm=self.ppm[i],
+            sub_total_base=self.base_imponible[i],
+            retiros_ejercicio=self.retiros_ejercicio[i],
+            multas_intereses_hist=self.multas_intereses_hist[i],
+            idpc_hist=self.idpc_hist[i],
+            rli_invertida=self.rli_invertida[i],
+            deduccion_incentivo=self.deduccion_incentivo[i],
+            porcentaje_rli=self.porcentaje_rli[i],
+            uf_limite=self.uf_limite[i],
+            idpc_con_incentivo=self.idpc_con_incentivo[i],
+            saldo_con_incentivo=self.saldo_con_incentivo[i],
+        )
+
+
+def _columna(valores, n: int, nombre: str) -> array:
+    """Columna de n enteros; un entero se repite para todos los contribuyentes."""
+    if isinstance(valores, int):
+        return array("q", [valores]) * n
+    if len(valores) != n:
+        raise ValueError(f"La columna {nombre} tiene {len(valores)} valores; se esperaban {n}")
+    return valores if isinstance(valores, array) and valores.typecode == "q" else array("q", valores)
+
+
+def calcular_lote(
+    total_ingresos: Sequence[int],
+    total_egresos: Sequence[int],
+    total_gastos_rechazados: Sequence[int],
+    ppm: Sequence[int],
+    retiros_ejercicio: Sequence[int] | int = 0,
+    multas_hist: Sequence[int] | int = 0,
+    idpc_hist: Sequence[int] | int = 0,
+    uf_valor_pesos: Sequence[int] | int = 0,
+) -> LoteRLI:
+    """
+    Calcula ambos regímenes para una cartera. Cada argumento es una columna
+    con un valor por contribuyente (todas del mismo largo); retiros, multas,
+    IDPC histórico y el valor de las UF límite aceptan también un entero
+    común a todos.
+    """
+    n = len(total_ingresos)
+    ing = _columna(total_ingresos, n, "total_ingresos")
+    egr = _columna(total_egresos, n, "total_egresos")
+    gr = _columna(total_gastos_rechazados, n, "total_gastos_rechazados")
+    ppm_ = _columna(ppm, n, "ppm")
+    ret = _columna(retiros_ejercicio, n, "retiros_ejercicio")
+    mul = _columna(multas_hist, n, "multas_hist")
+    idh = _columna(idpc_hist, n, "idpc_hist")
+    uf = _columna(uf_valor_pesos, n, "uf_valor_pesos")
+
+    base = array("q", map(add, map(sub, ing, egr), gr))
+    idpc_sin = array("q", TASA_IDPC_EXACTA.aplicar_columna(base, REDONDEO_IDPC))
+    rli = array("q", map(sub, map(sub, map(sub, base, ret), mul), idh))
+    porcentaje = array("q", TASA_INCENTIVO_RLI.aplicar_columna(rli, REDONDEO_IDPC))
+    deduccion = array("q", [max(min(p, u), 0) for p, u in zip(porcentaje, uf)])
+    idpc_con = array("q", TASA_IDPC_EXACTA.aplicar_columna(deduccion, REDONDEO_IDPC))
+
+    return LoteRLI(
+        total_ingresos=ing,
+        total_egresos=egr,
+        total_gastos_rechazados=gr,
+        ppm=ppm_,
+        retiros_ejercicio=ret,
+        multas_intereses_hist=mul,
+        idpc_hist=idh,
+        uf_limite=uf,
+        base_imponible=base,
+        idpc_sin_incentivo=idpc_sin,
+        saldo_sin_incentivo=array("q", map(sub, idpc_sin, ppm_)),
+        rli_invertida=rli,
+        porcentaje_rli=porcentaje,
+        deduccion_incentivo=deduccion,
+        idpc_con_incentivo=idpc_con,
+        saldo_con_incentivo=array("q", map(sub, idpc_con, ppm_)),
+    )
 
 
 # ---------------------------------------------------------------------------